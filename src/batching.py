@@ -0,0 +1,94 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+
+class MicroBatcher[T, R]:
+    """
+    Packs items submitted close together into one call of `cb`.
+
+    A batch is sent once it holds `max_batch_size` items or `max_batch_cost` worth of
+    items, or `max_wait_sec` after its first item arrived, whichever comes first. An
+    item that would push a batch over its cost starts the next one. `cb` returns one
+    result per item, in order; if it raises, every item of the batch gets the error.
+    """
+
+    def __init__(
+        self,
+        cb: Callable[[list[T]], Awaitable[list[R]]],
+        cost: Callable[[T], int],
+        max_batch_cost: int,
+        max_batch_size: int,
+        max_wait_sec: float,
+    ) -> None:
+        self.batches = 0
+        self.items = 0
+
+        self.__cb = cb
+        self.__cost = cost
+        self.__max_batch_cost = max_batch_cost
+        self.__max_batch_size = max_batch_size
+        self.__max_wait_sec = max_wait_sec
+
+        self.__pending = list[tuple[T, asyncio.Future[R]]]()
+        self.__pending_cost = 0
+        self.__timer: asyncio.TimerHandle | None = None
+        self.__running = set[asyncio.Task]()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        cost = self.__cost(item)
+
+        if self.__pending and self.__pending_cost + cost > self.__max_batch_cost:
+            self.__flush()
+
+        future = loop.create_future()
+        self.__pending.append((item, future))
+        self.__pending_cost += cost
+
+        if (
+            len(self.__pending) >= self.__max_batch_size
+            or self.__pending_cost >= self.__max_batch_cost
+        ):
+            self.__flush()
+        elif self.__timer is None:
+            self.__timer = loop.call_later(self.__max_wait_sec, self.__flush)
+
+        return await future
+
+    def __flush(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+        batch = self.__pending
+        self.__pending = []
+        self.__pending_cost = 0
+
+        # Items whose callers gave up are not worth sending.
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+
+        task = asyncio.ensure_future(self.__run(batch))
+        self.__running.add(task)
+        task.add_done_callback(self.__running.discard)
+
+    async def __run(self, batch: list[tuple[T, asyncio.Future[R]]]) -> None:
+        try:
+            results = await self.__cb([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Expected {len(batch)} batch results, got {len(results)}"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
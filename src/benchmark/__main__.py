@@ -0,0 +1,267 @@
+"""
+Offline load benchmark: runs whole research sessions against fake LLM and Tavily
+backends with realistic latency, so changes to concurrency, caching and
+summarization can be compared without API keys or spend.
+
+    cd src && python -m benchmark --sessions 20 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmark")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.5)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-output-tokens", type=int, default=300)
+
+    parser.add_argument("--search-latency-ms", type=float, default=1200)
+    parser.add_argument("--search-latency-sigma", type=float, default=0.4)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--page-chars", type=int, default=20000)
+    parser.add_argument("--url-pool-size", type=int, default=200)
+    parser.add_argument(
+        "--local-index",
+        help="search this local index (see `python -m local_search`) instead of "
+        "fake Tavily pages",
+    )
+
+    parser.add_argument("--supervisor-rounds", type=int, default=1)
+    parser.add_argument("--researchers-per-round", type=int, default=3)
+    parser.add_argument("--researcher-rounds", type=int, default=2)
+
+    parser.add_argument(
+        "--keep-caches",
+        action="store_true",
+        help="use the configured cache paths instead of fresh temporary ones",
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument(
+        "--fail-above-p95",
+        type=float,
+        help="exit with 1 when the p95 session latency exceeds this many seconds",
+    )
+
+    return parser.parse_args()
+
+
+def configure_env(args: argparse.Namespace) -> None:
+    """
+    Must run before `config` is imported: the config singleton is read from the
+    environment once.
+    """
+    os.environ.setdefault("XAI_API_KEY", "benchmark")
+    os.environ.setdefault("XAI_MODEL_NAME", "benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+    if not args.keep_caches:
+        cache_dir = tempfile.mkdtemp(prefix="silly-search-bench-")
+        os.environ["SEARCH_CACHE_PATH"] = os.path.join(cache_dir, "search.sqlite3")
+        os.environ["SUMMARY_CACHE_PATH"] = os.path.join(cache_dir, "summaries.sqlite3")
+        os.environ["CHECKPOINT_PATH"] = os.path.join(cache_dir, "checkpoints.sqlite3")
+        os.environ["TOOL_JOURNAL_PATH"] = os.path.join(
+            cache_dir, "tool_journal.sqlite3"
+        )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from benchmark.fakes import FakeAsyncTavilyClient, FakeChatModel
+    from config import cfg
+    import model_registry
+
+    chat_models = list[FakeChatModel]()
+
+    def chat_model_factory(**kwargs) -> FakeChatModel:
+        model = FakeChatModel(
+            latency_ms=args.llm_latency_ms,
+            latency_sigma=args.llm_latency_sigma,
+            failure_rate=args.llm_failure_rate,
+            output_tokens=args.llm_output_tokens,
+            supervisor_rounds=args.supervisor_rounds,
+            researchers_per_round=args.researchers_per_round,
+            researcher_rounds=args.researcher_rounds,
+            seed=args.seed,
+        )
+        chat_models.append(model)
+        return model
+
+    # The graph modules import the registry singleton by name, so it has to be
+    # swapped before they are imported.
+    model_registry.models = model_registry.ModelRegistry(
+        api_key=cfg.xai_api_key,
+        max_connections=cfg.llm_max_connections,
+        max_keepalive_connections=cfg.llm_max_keepalive_connections,
+        keepalive_expiry_sec=cfg.llm_keepalive_expiry_sec,
+        chat_model_factory=chat_model_factory,
+    )
+
+    from context import SillySearchContext
+    import main
+    from local_search.client import LocalSearchClient
+    from local_search.index import LocalIndex
+    import researcher.researcher_tools as researcher_tools
+    from search_backend import SearchBackend
+    import tavily_client
+
+    search_client: SearchBackend = tavily_client.TavilyClient(
+        api_key=cfg.tavily_api_key,
+        cache=tavily_client.search_cache(),
+        cache_ttl_sec={
+            "general": cfg.search_cache_ttl_general_sec,
+            "news": cfg.search_cache_ttl_news_sec,
+            "finance": cfg.search_cache_ttl_finance_sec,
+        },
+        limiter=tavily_client.search_limiter(),
+        sdk_client=FakeAsyncTavilyClient(
+            latency_ms=args.search_latency_ms,
+            latency_sigma=args.search_latency_sigma,
+            failure_rate=args.search_failure_rate,
+            page_chars=args.page_chars,
+            url_pool_size=args.url_pool_size,
+            seed=args.seed,
+        ),
+    )
+    if args.local_index:
+        search_client = LocalSearchClient(
+            index=LocalIndex(args.local_index),
+            snippet_chars=cfg.local_search_snippet_chars,
+        )
+    graph = await main.main()
+
+    sessions = asyncio.Semaphore(args.concurrency)
+    latencies = list[float]()
+    errors = list[str]()
+
+    async def run_session(i: int) -> None:
+        async with sessions:
+            started_at = time.perf_counter()
+            try:
+                await graph.ainvoke(
+                    {"messages": [("user", f"Research question number {i}")]},
+                    config={"configurable": {"thread_id": f"bench-{uuid.uuid4()}"}},
+                    context=SillySearchContext(search_client=search_client),
+                )
+                latencies.append(time.perf_counter() - started_at)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    lag = EventLoopLagSampler()
+    lag.start()
+    started_at = time.perf_counter()
+    await asyncio.gather(*(run_session(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started_at
+    await lag.stop()
+
+    return {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "completed": len(latencies),
+        "failed": len(errors),
+        "errors": sorted(set(errors))[:10],
+        "wall_sec": round(elapsed, 3),
+        "sessions_per_sec": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_sec": percentiles(latencies),
+        "event_loop_lag_ms": {
+            key: round(value * 1000, 3)
+            for key, value in percentiles(lag.samples).items()
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "llm_calls": sum(model.calls for model in chat_models),
+        "search_limiter": tavily_client.search_limiter().stats().model_dump(),
+        "llm_limiter": model_registry.llm_limiter.stats().model_dump(),
+        "llm_queue_wait_sec": {
+            priority: {
+                "avg": round(stats.avg_wait_sec, 4),
+                "max": round(stats.max_wait_sec, 4),
+            }
+            for priority, stats in model_registry.llm_limiter.priority_stats().items()
+        },
+        "summary_batches": {
+            "batches": researcher_tools.summary_batcher.batches,
+            "pages": researcher_tools.summary_batcher.items,
+        },
+    }
+
+
+class EventLoopLagSampler:
+    """
+    Measures how late a periodic sleep wakes up; anything blocking the loop (sync
+    I/O, CPU-heavy parsing) shows up as lag.
+    """
+
+    def __init__(self, interval_sec: float = 0.05) -> None:
+        self.interval_sec = interval_sec
+        self.samples = list[float]()
+        self.__task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.__task = asyncio.create_task(self.__sample())
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+
+    async def __sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self.interval_sec)
+            self.samples.append(max(0.0, loop.time() - started_at - self.interval_sec))
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    if len(values) == 1:
+        return {key: round(values[0], 3) for key in ("p50", "p95", "p99", "max")}
+
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49], 3),
+        "p95": round(cuts[94], 3),
+        "p99": round(cuts[98], 3),
+        "max": round(max(values), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def cli() -> None:
+    args = parse_args()
+    configure_env(args)
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if args.fail_above_p95 is not None and (
+        report["failed"] or report["latency_sec"]["p95"] > args.fail_above_p95
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,298 @@
+import asyncio
+import collections
+import hashlib
+import math
+import random
+import re
+import time
+import typing
+import uuid
+from collections.abc import Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+import utils
+
+WORDS = (
+    "analysis market energy policy research growth report data study model "
+    "system impact results evidence trend sector global regional annual cost "
+    "performance capacity demand supply investment technology survey index"
+).split()
+
+
+class FakeProviderError(Exception):
+    pass
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the xAI chat model.
+
+    It plays every role in the graph based on the tools bound to it: the supervisor
+    delegates `researchers_per_round` topics for `supervisor_rounds` rounds, each
+    researcher alternates search and think for `researcher_rounds` rounds, structured
+    outputs are filled from their JSON schema, and plain calls return text.
+    Latency is log-normal around `latency_ms`, and `failure_rate` of the calls raise.
+    """
+
+    latency_ms: float = 800
+    latency_sigma: float = 0.5
+    failure_rate: float = 0.0
+    output_tokens: int = 300
+    supervisor_rounds: int = 1
+    researchers_per_round: int = 3
+    researcher_rounds: int = 2
+    queries_per_search: int = 2
+    seed: int = 0
+
+    _attempts: collections.Counter[str] = PrivateAttr(
+        default_factory=collections.Counter
+    )
+
+    @property
+    def calls(self) -> int:
+        return sum(self._attempts.values())
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(
+        self,
+        tools: Sequence[typing.Any],
+        *,
+        tool_choice: str | None = None,
+        **kwargs: typing.Any,
+    ):
+        return self.bind(
+            tools=[convert_to_openai_tool(tool) for tool in tools],
+            tool_choice=tool_choice,
+            **kwargs,
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        rng = self.__rng(messages)
+        time.sleep(self.__latency(rng))
+        return self.__respond(messages, rng, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        rng = self.__rng(messages)
+        await asyncio.sleep(self.__latency(rng))
+        return self.__respond(messages, rng, **kwargs)
+
+    def __rng(self, messages: list[BaseMessage]) -> random.Random:
+        digest = hashlib.sha256(
+            "".join(str(message.content) for message in messages).encode()
+        ).hexdigest()
+        # Retries of the same request must be able to fail differently.
+        attempt = self._attempts[digest]
+        self._attempts[digest] += 1
+
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def __latency(self, rng: random.Random) -> float:
+        return rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def __respond(
+        self,
+        messages: list[BaseMessage],
+        rng: random.Random,
+        tools: list[dict] | None = None,
+        tool_choice: str | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        if rng.random() < self.failure_rate:
+            raise FakeProviderError("Simulated provider failure")
+
+        tool_names = [tool["function"]["name"] for tool in tools or []]
+        rounds = sum(isinstance(message, AIMessage) for message in messages)
+        topic = next(
+            (str(m.content) for m in messages if isinstance(m, HumanMessage)), ""
+        )[:80]
+
+        if "invoke_researcher" in tool_names:
+            tool_calls = (
+                [
+                    tool_call(
+                        "invoke_researcher",
+                        research_topic=f"Aspect {i + 1} of: {topic}",
+                    )
+                    for i in range(self.researchers_per_round)
+                ]
+                if rounds < self.supervisor_rounds
+                else [tool_call("ResearchCompleteTool")]
+            )
+            message = AIMessage(content="", tool_calls=tool_calls)
+        elif "search" in tool_names:
+            if rounds >= 2 * self.researcher_rounds:
+                tool_calls = [tool_call("ResearchCompleteTool")]
+            elif rounds % 2 == 0:
+                tool_calls = [
+                    tool_call(
+                        "search",
+                        queries=[
+                            f"{topic} {rng.choice(WORDS)} {rng.choice(WORDS)}"
+                            for _ in range(self.queries_per_search)
+                        ],
+                    )
+                ]
+            else:
+                tool_calls = [tool_call("think", reflection=lorem(rng, 60))]
+            message = AIMessage(content="", tool_calls=tool_calls)
+        elif tools:
+            schema = tools[0]["function"]
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    tool_call(
+                        schema["name"],
+                        **fill_schema(
+                            schema.get("parameters", {}),
+                            rng,
+                            block_ids=re.findall(
+                                r'<\w+ id="([^"]+)">', str(messages[-1].content)
+                            ),
+                        ),
+                    )
+                ],
+            )
+        else:
+            message = AIMessage(content=lorem(rng, self.output_tokens))
+
+        input_tokens = sum(
+            utils.estimate_tokens(str(message.content)) for message in messages
+        )
+        output_tokens = utils.estimate_tokens(str(message.content)) + 20
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeAsyncTavilyClient:
+    """
+    Stand-in for `tavily.AsyncTavilyClient.search` returning synthetic pages.
+
+    URLs are drawn from a pool of `url_pool_size` pages, so overlapping queries and
+    researchers hit the same sources the way real traffic does.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 1200,
+        latency_sigma: float = 0.4,
+        failure_rate: float = 0.0,
+        page_chars: int = 20000,
+        url_pool_size: int = 200,
+        seed: int = 0,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.page_chars = page_chars
+        self.url_pool_size = url_pool_size
+        self.seed = seed
+
+    async def search(
+        self,
+        query: str,
+        max_results: int = 5,
+        topic: str = "general",
+        include_raw_content: bool = False,
+        **kwargs: typing.Any,
+    ) -> dict:
+        rng = random.Random(f"{self.seed}:{topic}:{query}")
+        await asyncio.sleep(
+            rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+        )
+
+        if rng.random() < self.failure_rate:
+            raise FakeProviderError("Simulated search failure")
+
+        page_ids = rng.sample(range(self.url_pool_size), k=max_results)
+        return {
+            "query": query,
+            "results": [
+                self.__page(page_id, query, include_raw_content) for page_id in page_ids
+            ],
+        }
+
+    def __page(self, page_id: int, query: str, include_raw_content: bool) -> dict:
+        rng = random.Random(f"{self.seed}:page:{page_id}")
+        result = {
+            "url": f"https://bench.example/{page_id}",
+            "title": f"Synthetic page {page_id}",
+            "content": lorem(rng, 60),
+            "score": rng.random(),
+        }
+
+        if include_raw_content:
+            paragraphs = list[str]()
+            size = 0
+            while size < self.page_chars:
+                paragraph = f"{query}. {lorem(rng, 80)}"
+                paragraphs.append(paragraph)
+                size += len(paragraph) + 2
+            result["raw_content"] = "\n\n".join(paragraphs)
+
+        return result
+
+
+def tool_call(name: str, **args: typing.Any) -> dict:
+    return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}
+
+
+def fill_schema(
+    schema: dict, rng: random.Random, block_ids: list[str], block_id: str = ""
+) -> dict:
+    """
+    Arrays of objects get one item per `<tag id="...">` block of the prompt, with the
+    block's id in their `id` field, the way batched requests are answered.
+    """
+    values = dict[str, typing.Any]()
+    for name, prop in schema.get("properties", {}).items():
+        match prop.get("type"):
+            case "boolean":
+                values[name] = False
+            case "integer" | "number":
+                values[name] = 0
+            case "array" if prop.get("items", {}).get("type") == "object":
+                values[name] = [
+                    fill_schema(prop["items"], rng, block_ids=[], block_id=i)
+                    for i in block_ids
+                ]
+            case "array":
+                values[name] = []
+            case _ if name == "id" and block_id:
+                values[name] = block_id
+            case _:
+                values[name] = lorem(rng, 80)
+
+    return values
+
+
+def lorem(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
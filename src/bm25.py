@@ -0,0 +1,77 @@
+import collections
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have he her his i if in into is it its
+    of on or our she so than that the their them then there these they this to was we
+    were what when where which who will with you your
+    """.split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.casefold())
+        if token not in STOPWORDS
+    ]
+
+
+class BM25:
+    """
+    Okapi BM25 over an in-memory list of tokenized documents.
+    """
+
+    def __init__(
+        self, documents: list[list[str]], k1: float = 1.5, b: float = 0.75
+    ) -> None:
+        self.__k1 = k1
+        self.__b = b
+        self.__term_frequencies = [collections.Counter(doc) for doc in documents]
+        self.__lengths = [len(doc) for doc in documents]
+        self.__avg_length = (
+            sum(self.__lengths) / len(self.__lengths) if self.__lengths else 0.0
+        )
+
+        document_frequencies = collections.Counter[str]()
+        for frequencies in self.__term_frequencies:
+            document_frequencies.update(frequencies.keys())
+
+        self.__idf = {
+            term: idf(len(documents), frequency)
+            for term, frequency in document_frequencies.items()
+        }
+
+    def scores(self, query: list[str]) -> list[float]:
+        terms = set(query)
+
+        return [
+            sum(
+                self.__idf[term]
+                * term_score(
+                    frequencies[term],
+                    length,
+                    self.__avg_length,
+                    k1=self.__k1,
+                    b=self.__b,
+                )
+                for term in terms
+                if term in frequencies
+            )
+            for frequencies, length in zip(self.__term_frequencies, self.__lengths)
+        ]
+
+
+def idf(documents_count: int, document_frequency: int) -> float:
+    return math.log(
+        1 + (documents_count - document_frequency + 0.5) / (document_frequency + 0.5)
+    )
+
+
+def term_score(
+    frequency: int, length: int, avg_length: float, k1: float, b: float
+) -> float:
+    norm = 1 - b + b * (length / avg_length) if avg_length else 1.0
+    return frequency * (k1 + 1) / (frequency + k1 * norm)
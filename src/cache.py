@@ -0,0 +1,228 @@
+import asyncio
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+from collections.abc import Awaitable, Callable
+
+from pydantic import BaseModel
+
+import metrics
+
+
+class CacheStats(BaseModel):
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    expirations: int = 0
+    evictions: int = 0
+    writes: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TieredCache:
+    """
+    Two-tier key/value cache: an in-process LRU in front of an optional SQLite file.
+
+    Values must be JSON-serializable. Every entry may carry its own TTL, expired
+    entries are dropped lazily on read. The memory tier is bounded by entry count,
+    the disk tier by the total size of the stored values; both evict least recently
+    used entries first. The SQLite file is only created on first use.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_memory_entries: int,
+        path: str | None = None,
+        max_disk_bytes: int | None = None,
+    ) -> None:
+        self.stats = CacheStats()
+
+        self.__name = name
+
+        self.__max_memory_entries = max_memory_entries
+        self.__max_disk_bytes = max_disk_bytes
+        self.__memory = collections.OrderedDict[str, tuple[float | None, typing.Any]]()
+
+        self.__lock = threading.Lock()
+        self.__path = path or None
+        self.__db: sqlite3.Connection | None = None
+
+    async def get(self, key: str) -> typing.Any | None:
+        value = await self.__get(key)
+        metrics.record_cache_lookup(self.__name, hit=value is not None)
+
+        return value
+
+    async def __get(self, key: str) -> typing.Any | None:
+        now = time.time()
+
+        if key in self.__memory:
+            expires_at, value = self.__memory[key]
+            if expires_at is None or expires_at > now:
+                self.__memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return value
+
+            del self.__memory[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            if self.__path is not None:
+                await asyncio.to_thread(self.__disk_delete, key)
+            return None
+
+        if self.__path is None:
+            self.stats.misses += 1
+            return None
+
+        row = await asyncio.to_thread(self.__disk_get, key, now)
+        if row is None:
+            self.stats.misses += 1
+            return None
+
+        expires_at, value = row
+        self.stats.disk_hits += 1
+        self.__remember(key, expires_at, value)
+        return value
+
+    async def set(
+        self, key: str, value: typing.Any, ttl_sec: float | None = None
+    ) -> None:
+        expires_at = time.time() + ttl_sec if ttl_sec is not None else None
+
+        self.stats.writes += 1
+        self.__remember(key, expires_at, value)
+
+        if self.__path is not None:
+            await asyncio.to_thread(self.__disk_set, key, value, expires_at)
+
+    def __remember(self, key: str, expires_at: float | None, value: typing.Any) -> None:
+        self.__memory[key] = (expires_at, value)
+        self.__memory.move_to_end(key)
+
+        while len(self.__memory) > self.__max_memory_entries:
+            self.__memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def __disk_get(
+        self, key: str, now: float
+    ) -> tuple[float | None, typing.Any] | None:
+        with self.__lock:
+            db = self.__connection()
+            row = db.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                db.commit()
+                self.stats.expirations += 1
+                return None
+
+            db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+
+        return expires_at, json.loads(value)
+
+    def __disk_delete(self, key: str) -> None:
+        with self.__lock:
+            db = self.__connection()
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            db.commit()
+
+    def __disk_set(self, key: str, value: typing.Any, expires_at: float | None) -> None:
+        serialized = json.dumps(value, separators=(",", ":"))
+
+        with self.__lock:
+            db = self.__connection()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), expires_at, time.time()),
+            )
+
+            if self.__max_disk_bytes is not None:
+                (total,) = db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+                if total <= self.__max_disk_bytes:
+                    db.commit()
+                    return
+
+                for evicted_key, size in db.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed_at"
+                ).fetchall():
+                    if total <= self.__max_disk_bytes:
+                        break
+                    db.execute("DELETE FROM entries WHERE key = ?", (evicted_key,))
+                    total -= size
+                    self.stats.evictions += 1
+
+            db.commit()
+
+    def __connection(self) -> sqlite3.Connection:
+        """
+        Opens the SQLite file on first use; callers hold the lock.
+        """
+        if self.__db is None:
+            assert self.__path is not None
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.__path)), exist_ok=True)
+            db = sqlite3.connect(self.__path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+                """)
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+            )
+            db.commit()
+            self.__db = db
+
+        return self.__db
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution.
+
+    Callers arriving while a call for their key is still running await its result
+    instead of starting another one. The running call is shielded, so cancelling one
+    of the waiters does not cancel the work for the others.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self.__in_flight = dict[str, asyncio.Future]()
+
+    async def run[T](self, key: str, cb: Callable[[], Awaitable[T]]) -> T:
+        in_flight = self.__in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(in_flight)
+
+        task = asyncio.ensure_future(cb())
+        self.__in_flight[key] = task
+        task.add_done_callback(lambda _: self.__in_flight.pop(key, None))
+
+        return await asyncio.shield(task)
@@ -0,0 +1,236 @@
+import asyncio
+import collections
+import functools
+import math
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import AbstractAsyncContextManager
+
+from config import cfg
+import metrics
+
+
+class LatencyWindow:
+    """
+    The last `size` latencies of an endpoint.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.__latencies = collections.deque[float](maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.__latencies)
+
+    def observe(self, seconds: float) -> None:
+        self.__latencies.append(seconds)
+
+    def percentile(self, quantile: float) -> float | None:
+        if not self.__latencies:
+            return None
+
+        ordered = sorted(self.__latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(quantile * len(ordered)) - 1)]
+
+
+class HedgeBudget:
+    """
+    Token bucket: every call earns `ratio` of a hedge, every hedge spends a whole one,
+    so hedges never add more than `ratio` extra requests on top of a short burst.
+    """
+
+    def __init__(self, ratio: float, burst: float) -> None:
+        self.__ratio = ratio
+        self.__burst = burst
+        self.__tokens = burst
+
+    def earn(self) -> None:
+        self.__tokens = min(self.__burst, self.__tokens + self.__ratio)
+
+    def spend(self) -> bool:
+        if self.__tokens < 1:
+            return False
+
+        self.__tokens -= 1
+        return True
+
+
+class CallPolicy:
+    """
+    Latency policy for the calls of one endpoint (an LLM model and call shape, or a
+    Tavily topic).
+
+    Tracks the rolling latency of successful calls and, once `min_samples` are in,
+    derives from it:
+
+    - a timeout of `timeout_multiplier` times the `timeout_quantile` latency,
+      clamped to [`min_timeout_sec`, `max_timeout_sec`]; before that the timeout is
+      `max_timeout_sec`
+    - with hedging, a point (the `hedge_quantile` latency) at which a duplicate
+      call is fired if the first one has not returned yet. Whichever call succeeds
+      first wins, the other is cancelled. Hedges are paid for out of a `HedgeBudget`.
+
+    Timeouts raise `TimeoutError`, which the retry layers treat like any other error.
+
+    A caller that holds a concurrency slot for the call passes `hedge_slot`, so the
+    duplicate takes a slot of its own instead of running unaccounted in the first
+    call's slot.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int,
+        min_samples: int,
+        adaptive_timeouts: bool,
+        timeout_quantile: float,
+        timeout_multiplier: float,
+        min_timeout_sec: float,
+        max_timeout_sec: float,
+        hedging: bool,
+        hedge_quantile: float,
+        hedge_budget: HedgeBudget,
+    ) -> None:
+        self.hedges = 0
+        self.hedges_won = 0
+        self.timeouts = 0
+
+        self.__name = name
+        self.__latencies = LatencyWindow(window)
+        self.__min_samples = min_samples
+        self.__adaptive_timeouts = adaptive_timeouts
+        self.__timeout_quantile = timeout_quantile
+        self.__timeout_multiplier = timeout_multiplier
+        self.__min_timeout_sec = min_timeout_sec
+        self.__max_timeout_sec = max_timeout_sec
+        self.__hedging = hedging
+        self.__hedge_quantile = hedge_quantile
+        self.__hedge_budget = hedge_budget
+
+    def timeout_sec(self) -> float | None:
+        if not self.__adaptive_timeouts:
+            return None
+
+        latency = self.__percentile(self.__timeout_quantile)
+        if latency is None:
+            return self.__max_timeout_sec
+
+        return min(
+            self.__max_timeout_sec,
+            max(self.__min_timeout_sec, latency * self.__timeout_multiplier),
+        )
+
+    def hedge_delay_sec(self) -> float | None:
+        if not self.__hedging:
+            return None
+
+        return self.__percentile(self.__hedge_quantile)
+
+    async def run[T](
+        self,
+        cb: Callable[[], Awaitable[T]],
+        hedge_slot: Callable[[], AbstractAsyncContextManager] | None = None,
+    ) -> T:
+        self.__hedge_budget.earn()
+        timeout = self.timeout_sec()
+
+        try:
+            async with asyncio.timeout(timeout):
+                return await self.__run_hedged(cb, hedge_slot)
+        except TimeoutError:
+            self.timeouts += 1
+            metrics.record_call_timeout(self.__name)
+            raise
+
+    async def __run_hedged[T](
+        self,
+        cb: Callable[[], Awaitable[T]],
+        hedge_slot: Callable[[], AbstractAsyncContextManager] | None,
+    ) -> T:
+        hedge_delay = self.hedge_delay_sec()
+        if hedge_delay is None:
+            return await self.__timed(cb)
+
+        primary = asyncio.ensure_future(self.__timed(cb))
+        attempts = [primary]
+        try:
+            done, _ = await asyncio.wait([primary], timeout=hedge_delay)
+            if not done and self.__hedge_budget.spend():
+                self.hedges += 1
+                attempts.append(asyncio.ensure_future(self.__hedge(cb, hedge_slot)))
+
+            error: BaseException | None = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not primary:
+                            self.hedges_won += 1
+                        if len(attempts) > 1:
+                            metrics.record_hedge(
+                                self.__name,
+                                "hedge" if attempt is not primary else "primary",
+                            )
+                        return attempt.result()
+                    error = error or attempt.exception()
+
+            assert error is not None
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def __hedge[T](
+        self,
+        cb: Callable[[], Awaitable[T]],
+        hedge_slot: Callable[[], AbstractAsyncContextManager] | None,
+    ) -> T:
+        if hedge_slot is None:
+            return await self.__timed(cb)
+
+        # Time spent queueing for the slot is not latency of the endpoint.
+        async with hedge_slot():
+            return await self.__timed(cb)
+
+    async def __timed[T](self, cb: Callable[[], Awaitable[T]]) -> T:
+        started_at = time.perf_counter()
+        result = await cb()
+        self.__latencies.observe(time.perf_counter() - started_at)
+
+        return result
+
+    def __percentile(self, quantile: float) -> float | None:
+        if len(self.__latencies) < self.__min_samples:
+            return None
+
+        return self.__latencies.percentile(quantile)
+
+
+@functools.cache
+def hedge_budget() -> HedgeBudget:
+    """
+    One budget for every endpoint, so hedging is bounded by total load.
+    """
+    return HedgeBudget(ratio=cfg.hedge_budget_ratio, burst=cfg.hedge_budget_burst)
+
+
+@functools.cache
+def call_policy(name: str) -> CallPolicy:
+    """
+    The process-wide policy of endpoint `name`.
+    """
+    return CallPolicy(
+        name=name,
+        window=cfg.call_latency_window,
+        min_samples=cfg.call_latency_min_samples,
+        adaptive_timeouts=cfg.adaptive_timeouts_enabled,
+        timeout_quantile=cfg.adaptive_timeout_quantile,
+        timeout_multiplier=cfg.adaptive_timeout_multiplier,
+        min_timeout_sec=cfg.adaptive_timeout_min_sec,
+        max_timeout_sec=cfg.adaptive_timeout_max_sec,
+        hedging=cfg.hedging_enabled,
+        hedge_quantile=cfg.hedge_quantile,
+        hedge_budget=hedge_budget(),
+    )
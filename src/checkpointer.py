@@ -0,0 +1,480 @@
+import asyncio
+import functools
+import json
+import os
+import random
+import sqlite3
+import threading
+import typing
+import zlib
+from collections.abc import AsyncIterator, Iterator, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+from config import cfg
+
+COMPRESSION_LEVEL = 6
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    Checkpoint saver backed by a SQLite file.
+
+    A checkpoint only stores the channels whose version changed since its parent;
+    unchanged channels point at blobs written by earlier checkpoints. Blobs and
+    pending writes of `compress_min_bytes` or more are zlib-compressed.
+
+    Retention: each namespace of a thread keeps its last `keep_last` checkpoints, and
+    blobs no kept checkpoint references are deleted. Subgraph namespaces (researchers)
+    are dropped once the root graph checkpoints past the step that ran them, since a
+    finished step never resumes its subgraphs.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        keep_last: int,
+        compress_min_bytes: int,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        super().__init__(serde=serde)
+
+        self.__keep_last = max(1, keep_last)
+        self.__compress_min_bytes = compress_min_bytes
+
+        self.__lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                root_checkpoint_id TEXT,
+                channel_versions TEXT NOT NULL,
+                type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                version TEXT NOT NULL,
+                type TEXT NOT NULL,
+                compressed INTEGER NOT NULL,
+                blob BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                compressed INTEGER NOT NULL,
+                blob BLOB NOT NULL,
+                task_path TEXT NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            """)
+        self.__db.commit()
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        query = "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params: tuple = (thread_id, checkpoint_ns)
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self.__lock:
+            row = self.__db.execute(query, params).fetchone()
+            if row is None:
+                return None
+
+            return self.__load_tuple(thread_id, checkpoint_ns, *row)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, typing.Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        clauses = list[str]()
+        params = list[typing.Any]()
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+
+        with self.__lock:
+            rows = self.__db.execute(query, params).fetchall()
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                return
+
+            metadata = self.serde.loads_typed((row[4], row[5]))
+            if filter and not all(
+                metadata.get(key) == value for key, value in filter.items()
+            ):
+                continue
+
+            with self.__lock:
+                checkpoint_tuple = self.__load_tuple(thread_id, checkpoint_ns, *row)
+            if limit is not None:
+                limit -= 1
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        # The root checkpoint a subgraph runs under, used to drop it once finished.
+        root_checkpoint_id = (
+            config["configurable"].get("checkpoint_map", {}).get("")
+            if checkpoint_ns
+            else None
+        )
+
+        saved = checkpoint.copy()
+        values: dict[str, typing.Any] = saved.pop("channel_values")  # type: ignore[misc]
+        blobs = [
+            (
+                thread_id,
+                checkpoint_ns,
+                channel,
+                str(version),
+                *(
+                    self.__dump(values[channel])
+                    if channel in values
+                    else ("empty", 0, None)
+                ),
+            )
+            for channel, version in new_versions.items()
+        ]
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(saved)
+        metadata_type, metadata_blob = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+
+        with self.__lock:
+            self.__db.executemany(
+                "INSERT OR REPLACE INTO blobs (thread_id, checkpoint_ns, channel, version, type, compressed, blob) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                blobs,
+            )
+            self.__db.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, root_checkpoint_id, channel_versions, type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    root_checkpoint_id,
+                    json.dumps(
+                        {
+                            channel: str(version)
+                            for channel, version in checkpoint[
+                                "channel_versions"
+                            ].items()
+                        }
+                    ),
+                    checkpoint_type,
+                    checkpoint_blob,
+                    metadata_type,
+                    metadata_blob,
+                ),
+            )
+            self.__prune(thread_id, checkpoint_ns)
+            if not checkpoint_ns:
+                self.__drop_finished_subgraphs(thread_id, checkpoint["id"])
+            self.__db.commit()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, typing.Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = [
+            (
+                channel in WRITES_IDX_MAP,
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.__dump(value),
+                task_path,
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+
+        with self.__lock:
+            # Special writes (errors, interrupts...) replace earlier ones, regular
+            # writes of a task are only recorded once.
+            for conflict, special in (("REPLACE", True), ("IGNORE", False)):
+                self.__db.executemany(
+                    f"INSERT OR {conflict} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, compressed, blob, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row[1:] for row in rows if row[0] is special],
+                )
+            self.__db.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.__lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self.__db.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,)
+                )
+            self.__db.commit()
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, typing.Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: [
+                *self.list(config, filter=filter, before=before, limit=limit),
+            ]
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, typing.Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def __load_tuple(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        parent_checkpoint_id: str | None,
+        checkpoint_type: str,
+        checkpoint_blob: bytes,
+        metadata_type: str,
+        metadata_blob: bytes,
+    ) -> CheckpointTuple:
+        checkpoint: Checkpoint = self.serde.loads_typed(
+            (checkpoint_type, checkpoint_blob)
+        )
+
+        channel_values = dict[str, typing.Any]()
+        for channel, version in checkpoint["channel_versions"].items():
+            row = self.__db.execute(
+                "SELECT type, compressed, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is not None and row[0] != "empty":
+                channel_values[channel] = self.__load(*row)
+
+        pending_writes = [
+            (task_id, channel, self.__load(value_type, compressed, blob))
+            for task_id, channel, value_type, compressed, blob in self.__db.execute(
+                "SELECT task_id, channel, type, compressed, blob FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        ]
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=pending_writes,
+        )
+
+    def __prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        stale = [
+            checkpoint_id
+            for (checkpoint_id,) in self.__db.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.__keep_last),
+            )
+        ]
+        if not stale:
+            return
+
+        for table in ("checkpoints", "writes"):
+            self.__db.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id in stale],
+            )
+
+        referenced = {
+            (channel, version)
+            for (channel_versions,) in self.__db.execute(
+                "SELECT channel_versions FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns),
+            )
+            for channel, version in json.loads(channel_versions).items()
+        }
+        self.__db.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [
+                (thread_id, checkpoint_ns, channel, version)
+                for channel, version in self.__db.execute(
+                    "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                    (thread_id, checkpoint_ns),
+                ).fetchall()
+                if (channel, version) not in referenced
+            ],
+        )
+
+    def __drop_finished_subgraphs(self, thread_id: str, checkpoint_id: str) -> None:
+        """
+        Subgraphs that ran under a root checkpoint older than `checkpoint_id` belong to
+        steps that have completed.
+        """
+        finished = [
+            (thread_id, checkpoint_ns)
+            for (checkpoint_ns,) in self.__db.execute(
+                "SELECT checkpoint_ns FROM checkpoints WHERE thread_id = ? AND checkpoint_ns != '' GROUP BY checkpoint_ns HAVING MAX(root_checkpoint_id) < ?",
+                (thread_id, checkpoint_id),
+            )
+        ]
+        for table in ("checkpoints", "blobs", "writes"):
+            self.__db.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?",
+                finished,
+            )
+
+    def __dump(self, value: typing.Any) -> tuple[str, int, bytes]:
+        value_type, blob = self.serde.dumps_typed(value)
+        if len(blob) >= self.__compress_min_bytes:
+            return value_type, 1, zlib.compress(blob, COMPRESSION_LEVEL)
+
+        return value_type, 0, blob
+
+    def __load(self, value_type: str, compressed: int, blob: bytes) -> typing.Any:
+        return self.serde.loads_typed(
+            (value_type, zlib.decompress(blob) if compressed else blob)
+        )
+
+
+@functools.cache
+def default_checkpointer() -> BaseCheckpointSaver:
+    """
+    The process-wide checkpointer shared by every graph built in this process.
+    """
+    match cfg.checkpointer:
+        case "memory":
+            return InMemorySaver()
+        case _:
+            return SqliteCheckpointer(
+                path=cfg.cache_path(cfg.checkpoint_path),
+                keep_last=cfg.checkpoint_keep_last,
+                compress_min_bytes=cfg.checkpoint_compress_min_bytes,
+            )
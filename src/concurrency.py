@@ -0,0 +1,279 @@
+import asyncio
+import contextlib
+import time
+import typing
+from collections.abc import AsyncIterator
+
+from pydantic import BaseModel
+
+import metrics
+from scheduling import FairQueue, PRIORITIES, Priority
+
+
+class LimiterStats(BaseModel):
+    limit: int
+    in_flight: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    acquired: int = 0
+    total_wait_sec: float = 0.0
+    max_wait_sec: float = 0.0
+
+    @property
+    def avg_wait_sec(self) -> float:
+        return self.total_wait_sec / self.acquired if self.acquired else 0.0
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of in-flight calls sharing this limiter and records how long
+    callers queue for a slot.
+    """
+
+    def __init__(self, name: str, limit: int) -> None:
+        self.__name = name
+        self.__semaphore = asyncio.Semaphore(limit)
+        self.__stats = LimiterStats(limit=limit)
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """
+        :return: seconds spent waiting for the slot
+        """
+        started_at = time.perf_counter()
+
+        self.__stats.queue_depth += 1
+        self.__stats.max_queue_depth = max(
+            self.__stats.max_queue_depth, self.__stats.queue_depth
+        )
+        try:
+            await self.__semaphore.acquire()
+        finally:
+            self.__stats.queue_depth -= 1
+
+        waited = time.perf_counter() - started_at
+        self.__stats.acquired += 1
+        self.__stats.total_wait_sec += waited
+        self.__stats.max_wait_sec = max(self.__stats.max_wait_sec, waited)
+        self.__stats.in_flight += 1
+        metrics.record_queue_time(self.__name, waited)
+        try:
+            yield waited
+        finally:
+            self.__stats.in_flight -= 1
+            self.__semaphore.release()
+
+    def stats(self) -> LimiterStats:
+        return self.__stats.model_copy()
+
+
+BASELINE_SAMPLES = 20
+
+type Limiter = ConcurrencyLimiter | AdaptiveLimiter
+
+# Matched by name anywhere in the exception's class hierarchy, so provider SDKs
+# don't have to be imported here.
+OVERLOAD_ERRORS = frozenset(
+    {"RateLimitError", "UsageLimitExceededError", "TimeoutError", "APITimeoutError"}
+)
+
+
+class AdaptiveLimiter:
+    """
+    Like `ConcurrencyLimiter`, but the limit follows what the provider can take
+    (additive increase, multiplicative decrease):
+
+    - every successful call made while the limit was the bottleneck raises it by
+      1/limit, about one slot per limit-worth of calls
+    - a rate limit or timeout error, or latency inflating past `latency_tolerance`
+      times its usual level, multiplies it by `backoff_factor`
+
+    Usual latency is tracked per `endpoint`, as call shapes differ widely. Only calls
+    started after the last decrease can trigger the next one, so a burst of errors
+    from calls already in flight backs off once.
+
+    Callers that have to wait are served by `priority`, fairly between sessions
+    (see `FairQueue`); queue waits are recorded per priority.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        backoff_factor: float,
+        latency_tolerance: float,
+        priority_aging_sec: float,
+    ) -> None:
+        self.__name = name
+        self.__limit = float(initial_limit)
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__backoff_factor = backoff_factor
+        self.__latency_tolerance = latency_tolerance
+
+        self.__in_flight = 0
+        self.__waiters = FairQueue[asyncio.Future[None]](aging_sec=priority_aging_sec)
+        self.__generation = 0
+        self.__baselines = dict[str, tuple[int, float]]()
+        self.__inflation = 1.0
+        self.__stats = LimiterStats(limit=initial_limit)
+        self.__priority_stats = {
+            priority: LimiterStats(limit=initial_limit) for priority in PRIORITIES
+        }
+
+        metrics.record_concurrency_limit(name, initial_limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self.__limit)
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self, endpoint: str = "", priority: Priority = "research"
+    ) -> AsyncIterator[float]:
+        """
+        :return: seconds spent waiting for the slot
+        """
+        started_at = time.perf_counter()
+        saturated = self.__in_flight + 1 >= self.limit or bool(self.__waiters)
+
+        stats = (self.__stats, self.__priority_stats[priority])
+        for s in stats:
+            s.queue_depth += 1
+            s.max_queue_depth = max(s.max_queue_depth, s.queue_depth)
+        try:
+            await self.__acquire(priority, session=metrics.current_run_id())
+        finally:
+            for s in stats:
+                s.queue_depth -= 1
+
+        waited = time.perf_counter() - started_at
+        for s in stats:
+            s.acquired += 1
+            s.total_wait_sec += waited
+            s.max_wait_sec = max(s.max_wait_sec, waited)
+        metrics.record_queue_time(self.__name, waited, priority=priority)
+
+        generation = self.__generation
+        called_at = time.perf_counter()
+        try:
+            yield waited
+        except Exception as e:
+            if is_overload(e):
+                self.__back_off(generation, reason="overload")
+            raise
+        else:
+            latency = time.perf_counter() - called_at
+            if self.__is_inflated(endpoint, latency, saturated):
+                self.__back_off(generation, reason="latency")
+            elif saturated:
+                self.__grow()
+        finally:
+            self.__release()
+
+    def stats(self) -> LimiterStats:
+        return self.__stats.model_copy(
+            update={"limit": self.limit, "in_flight": self.__in_flight}
+        )
+
+    def priority_stats(self) -> dict[Priority, LimiterStats]:
+        """
+        Queueing by priority; `in_flight` is not tracked per priority.
+        """
+        return {
+            priority: stats.model_copy(update={"limit": self.limit})
+            for priority, stats in self.__priority_stats.items()
+        }
+
+    async def __acquire(self, priority: Priority, session: str) -> None:
+        if self.__in_flight < self.limit and not self.__waiters:
+            self.__in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.__waiters.push(waiter, priority=priority, session=session)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Woken up and cancelled at once: pass the slot on.
+                self.__release()
+            else:
+                try:
+                    self.__waiters.remove(waiter)
+                except ValueError:
+                    # A wake-up already popped it and skipped it as cancelled.
+                    pass
+            raise
+
+    def __release(self) -> None:
+        self.__in_flight -= 1
+        self.__wake()
+
+    def __wake(self) -> None:
+        while self.__waiters and self.__in_flight < self.limit:
+            waiter = self.__waiters.pop()
+            if not waiter.done():
+                self.__in_flight += 1
+                waiter.set_result(None)
+
+    def __is_inflated(self, endpoint: str, latency: float, saturated: bool) -> bool:
+        samples, baseline = self.__baselines.get(endpoint, (0, 0.0))
+        if samples < BASELINE_SAMPLES:
+            # The usual latency starts as the plain mean of the first calls.
+            self.__baselines[endpoint] = (
+                samples + 1,
+                baseline + (latency - baseline) / (samples + 1),
+            )
+            return False
+
+        # Afterwards it follows drops quickly but rises only slowly, and only on
+        # calls that did not compete for a full limiter (unless it can't shrink any
+        # further), so inflation we cause ourselves never becomes the new normal.
+        # The current trend is a faster average of latency relative to it, over
+        # every endpoint.
+        if latency < baseline:
+            rate = 0.02
+        elif not saturated or self.limit <= self.__min_limit:
+            rate = 0.002
+        else:
+            rate = 0.0
+        self.__baselines[endpoint] = (
+            samples + 1,
+            baseline + rate * (latency - baseline),
+        )
+        if baseline > 0:
+            self.__inflation += 0.05 * (latency / baseline - self.__inflation)
+
+        return self.__inflation > self.__latency_tolerance
+
+    def __grow(self) -> None:
+        previous = self.limit
+        self.__limit = min(self.__max_limit, self.__limit + 1 / self.__limit)
+        if self.limit != previous:
+            metrics.record_concurrency_limit(self.__name, self.limit)
+            self.__wake()
+
+    def __back_off(
+        self, generation: int, reason: typing.Literal["overload", "latency"]
+    ) -> None:
+        if generation != self.__generation:
+            return
+
+        self.__generation += 1
+        self.__inflation = 1.0
+        self.__limit = max(self.__min_limit, self.__limit * self.__backoff_factor)
+        metrics.record_concurrency_limit(self.__name, self.limit)
+        metrics.record_concurrency_backoff(self.__name, reason)
+
+
+def is_overload(e: BaseException) -> bool:
+    if any(cls.__name__ in OVERLOAD_ERRORS for cls in type(e).__mro__):
+        return True
+
+    status_code = getattr(e, "status_code", None) or getattr(
+        getattr(e, "response", None), "status_code", None
+    )
+    return status_code == 429
@@ -1,31 +1,196 @@
 from langchain_core.runnables import RunnableConfig
-from pydantic import BaseModel, Field
+from langgraph.config import get_config
+from pydantic import BaseModel, ConfigDict, Field
 
 import os
 import typing
 
+type ModelRole = typing.Literal[
+    "summarizer", "clarifier", "brief_writer", "supervisor", "researcher", "compressor"
+]
+
+
+class ModelSettings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    model: str
+    max_retries: int
+    timeout_sec: float | None = None
+    max_tokens: int | None = None
+
 
 class Config(BaseModel):
     xai_api_key: str = Field()
     xai_model_name: str = Field()
 
-    tavily_api_key: str = Field()
+    # Only needed with the Tavily search backend.
+    tavily_api_key: str = Field(default="")
 
     max_llm_retries: int = Field(default=3)
+
+    # Per-role overrides of the model, its retries, request timeout and output cap.
+    # Unset model and retries fall back to xai_model_name and max_llm_retries. The
+    # request timeout bounds a single HTTP attempt, which is retried like any error.
+    summarizer_model_name: str | None = Field(default=None)
+    summarizer_max_retries: int | None = Field(default=None)
+    summarizer_timeout_sec: float | None = Field(default=None)
+    summarizer_max_tokens: int | None = Field(default=None)
+    clarifier_model_name: str | None = Field(default=None)
+    clarifier_max_retries: int | None = Field(default=None)
+    clarifier_timeout_sec: float | None = Field(default=None)
+    clarifier_max_tokens: int | None = Field(default=None)
+    brief_writer_model_name: str | None = Field(default=None)
+    brief_writer_max_retries: int | None = Field(default=None)
+    brief_writer_timeout_sec: float | None = Field(default=None)
+    brief_writer_max_tokens: int | None = Field(default=None)
+    supervisor_model_name: str | None = Field(default=None)
+    supervisor_max_retries: int | None = Field(default=None)
+    supervisor_timeout_sec: float | None = Field(default=None)
+    supervisor_max_tokens: int | None = Field(default=None)
+    researcher_model_name: str | None = Field(default=None)
+    researcher_max_retries: int | None = Field(default=None)
+    researcher_timeout_sec: float | None = Field(default=None)
+    researcher_max_tokens: int | None = Field(default=None)
+    compressor_model_name: str | None = Field(default=None)
+    compressor_max_retries: int | None = Field(default=None)
+    compressor_timeout_sec: float | None = Field(default=None)
+    compressor_max_tokens: int | None = Field(default=None)
+
+    speculative_research_brief_enabled: bool = Field(default=False)
+    speculative_supervise_enabled: bool = Field(default=False)
     max_supervisor_iterations: int = Field(default=3)
     max_concurrent_researchers: int = Field(default=3)
+    queue_overflow_researchers: bool = Field(default=False)
     max_crawl_content_length: int = Field(default=50000)
+    content_reduction_enabled: bool = Field(default=True)
+    summarization_input_token_budget: int = Field(default=3000)
     max_researcher_iterations: int = Field(default=10)
+    incremental_compression_enabled: bool = Field(default=True)
+    novelty_early_stop_enabled: bool = Field(default=False)
+    novelty_threshold: float = Field(default=0.2)
+    novelty_patience_rounds: int = Field(default=2)
+    novelty_minhash_permutations: int = Field(default=64)
+
+    context_compaction_enabled: bool = Field(default=True)
+    researcher_context_token_budget: int = Field(default=24000)
+    supervisor_context_token_budget: int = Field(default=32000)
+    compaction_keep_recent_messages: int = Field(default=6)
+    compaction_note_tokens: int = Field(default=300)
+    # Bounds a whole summarization, queueing and retries included, on top of the
+    # summarizer_timeout_sec of each attempt; whichever runs out first ends it.
     summarization_timeout_sec: int = Field(default=60)
+    max_concurrent_summaries: int = Field(default=16)
+    chunked_summarization_enabled: bool = Field(default=False)
+    summarization_chunk_tokens: int = Field(default=3000)
+    max_summarization_chunks: int = Field(default=8)
+    summary_batching_enabled: bool = Field(default=False)
+    summary_batch_max_tokens: int = Field(default=6000)
+    summary_batch_max_page_tokens: int = Field(default=1500)
+    summary_batch_max_pages: int = Field(default=8)
+    summary_batch_wait_ms: int = Field(default=50)
+    near_duplicate_detection_enabled: bool = Field(default=True)
+    near_duplicate_threshold: float = Field(default=0.8)
+    max_concurrent_searches: int = Field(default=8)
+    min_concurrent_searches: int = Field(default=1)
+    max_adaptive_concurrent_searches: int = Field(default=32)
+    search_min_summaries: int = Field(default=0)
+    search_latency_budget_sec: float = Field(default=0)
+
+    source_ids_enabled: bool = Field(default=True)
+
+    # Relative cache, index, checkpoint and journal paths below are resolved against
+    # this directory, see `cache_path`.
+    cache_dir: str = Field(
+        default=os.path.join(os.path.expanduser("~"), ".cache", "silly-search")
+    )
+
+    search_backend: typing.Literal["tavily", "local"] = Field(default="tavily")
+    # Built with `python -m local_search <corpus paths>`.
+    local_index_path: str = Field(default="local_index")
+    local_search_snippet_chars: int = Field(default=500)
+
+    search_cache_enabled: bool = Field(default=True)
+    search_cache_path: str = Field(default="search.sqlite3")
+    search_cache_max_memory_entries: int = Field(default=512)
+    search_cache_max_disk_bytes: int = Field(default=256 * 1024 * 1024)
+    search_cache_ttl_general_sec: int = Field(default=7 * 24 * 60 * 60)
+    search_cache_ttl_news_sec: int = Field(default=60 * 60)
+    search_cache_ttl_finance_sec: int = Field(default=15 * 60)
+
+    summary_cache_enabled: bool = Field(default=True)
+    summary_cache_path: str = Field(default="summaries.sqlite3")
+    summary_cache_max_memory_entries: int = Field(default=1024)
+    summary_cache_max_disk_bytes: int = Field(default=512 * 1024 * 1024)
+    summary_cache_version: str = Field(default="1")
+
+    llm_max_connections: int = Field(default=100)
+    # With adaptive concurrency, in-flight limits start at the initial value and move
+    # between the min and max settings (max_concurrent_searches for Tavily).
+    adaptive_concurrency_enabled: bool = Field(default=True)
+    adaptive_concurrency_backoff_factor: float = Field(default=0.7)
+    adaptive_concurrency_latency_tolerance: float = Field(default=2.0)
+    llm_initial_concurrency: int = Field(default=16)
+    llm_min_concurrency: int = Field(default=2)
+    # Every this many seconds of queueing promote a waiting call one priority class.
+    priority_aging_sec: float = Field(default=5, gt=0)
+    llm_max_keepalive_connections: int = Field(default=20)
+    llm_keepalive_expiry_sec: int = Field(default=60)
+
+    call_latency_window: int = Field(default=200)
+    call_latency_min_samples: int = Field(default=20)
+    adaptive_timeouts_enabled: bool = Field(default=False)
+    adaptive_timeout_quantile: float = Field(default=0.99)
+    adaptive_timeout_multiplier: float = Field(default=3.0)
+    adaptive_timeout_min_sec: float = Field(default=10)
+    adaptive_timeout_max_sec: float = Field(default=300)
+    hedging_enabled: bool = Field(default=False)
+    hedge_quantile: float = Field(default=0.95)
+    hedge_budget_ratio: float = Field(default=0.05)
+    hedge_budget_burst: float = Field(default=5)
+
+    checkpointer: typing.Literal["sqlite", "memory"] = Field(default="sqlite")
+    checkpoint_path: str = Field(default="checkpoints.sqlite3")
+    checkpoint_keep_last: int = Field(default=3)
+    checkpoint_compress_min_bytes: int = Field(default=1024)
+    researcher_checkpointing_enabled: bool = Field(default=True)
+
+    tool_journal_enabled: bool = Field(default=True)
+    tool_journal_path: str = Field(default="tool_journal.sqlite3")
+    tool_journal_max_memory_entries: int = Field(default=256)
+    tool_journal_max_disk_bytes: int = Field(default=256 * 1024 * 1024)
+    tool_journal_ttl_sec: int = Field(default=24 * 60 * 60)
+
+    metrics_enabled: bool = Field(default=False)
+    metrics_run_summary_dir: str = Field(default="")
+
+    def cache_path(self, path: str) -> str:
+        """
+        `path` as an absolute path, relative ones taken to be under `cache_dir`.
+        """
+        return os.path.join(os.path.abspath(os.path.expanduser(self.cache_dir)), path)
+
+    def model_settings(self, role: ModelRole) -> ModelSettings:
+        model = getattr(self, f"{role}_model_name")
+        max_retries = getattr(self, f"{role}_max_retries")
+
+        return ModelSettings(
+            model=model or self.xai_model_name,
+            max_retries=self.max_llm_retries if max_retries is None else max_retries,
+            timeout_sec=getattr(self, f"{role}_timeout_sec"),
+            max_tokens=getattr(self, f"{role}_max_tokens"),
+        )
 
     @classmethod
     def from_runnable_config(cls, config: RunnableConfig | None = None) -> "Config":
         keys = cls.model_fields.keys()
+        configurable = (config or {}).get("configurable") or {}
 
         cfg = dict[str, typing.Any]()
 
         for key in keys:
-            if config and config.get(key):
+            if configurable.get(key) is not None:
+                value = configurable.get(key)
+            elif config and config.get(key):
                 value = config.get(key)
             elif os.environ.get(key.upper()):
                 value = os.environ.get(key.upper())
@@ -37,3 +202,20 @@ class Config(BaseModel):
 
 
 cfg = Config.from_runnable_config()
+
+
+def run_config() -> Config:
+    """
+    The config of the current run: `cfg`, unless the run's `configurable` overrides
+    some of its fields.
+    """
+    try:
+        config = get_config()
+    except RuntimeError:
+        return cfg
+
+    configurable = config.get("configurable") or {}
+    if not any(key in configurable for key in Config.model_fields):
+        return cfg
+
+    return Config.from_runnable_config(config)
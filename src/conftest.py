@@ -0,0 +1,5 @@
+import os
+
+# config reads its settings at import time and requires the model settings.
+os.environ.setdefault("XAI_API_KEY", "test")
+os.environ.setdefault("XAI_MODEL_NAME", "test-model")
@@ -0,0 +1,185 @@
+import hashlib
+import re
+
+import bm25
+import utils
+
+MARKDOWN_LINK_PATTERN = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+URL_PATTERN = re.compile(r"https?://\S+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|privacy policy|terms of (use|service)|all rights reserved|subscribe|"
+    r"sign (in|up)|log ?in|newsletter|advertisement|skip to (main )?content|"
+    r"share (this|on)|follow us|accept all|back to top",
+    re.IGNORECASE,
+)
+
+PASSAGE_WORDS = 120
+
+
+def reduce_content(content: str, query: str, token_budget: int) -> str:
+    """
+    Shrinks a raw page to the passages most relevant to `query`.
+
+    Boilerplate lines (navigation, link lists, cookie banners...) are dropped and
+    repeated blocks are kept once. If the cleaned page still exceeds `token_budget`,
+    it is split into passages that are ranked with BM25 against the query, and the
+    best ones are kept in their original order. Pages where nothing survives are
+    truncated instead.
+    """
+    blocks = dedupe_blocks(strip_boilerplate(content))
+    if not blocks:
+        return content[: token_budget * 4]
+
+    cleaned = "\n\n".join(blocks)
+
+    if utils.estimate_tokens(cleaned) <= token_budget:
+        return cleaned
+
+    passages = split_passages(blocks)
+    scores = bm25.BM25([bm25.tokenize(passage) for passage in passages]).scores(
+        bm25.tokenize(query)
+    )
+
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+
+    selected = list[int]()
+    used_tokens = 0
+    for i in ranked:
+        tokens = utils.estimate_tokens(passages[i])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(i)
+        used_tokens += tokens
+
+    if not selected:
+        return cleaned[: token_budget * 4]
+
+    return "\n\n[...]\n\n".join(passages[i] for i in sorted(selected))
+
+
+def strip_boilerplate(content: str) -> list[str]:
+    blocks = list[str]()
+    current = list[str]()
+
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+
+        if not is_boilerplate(line):
+            current.append(line)
+
+    if current:
+        blocks.append("\n".join(current))
+
+    return blocks
+
+
+def is_boilerplate(line: str) -> bool:
+    text = URL_PATTERN.sub("", MARKDOWN_LINK_PATTERN.sub(r"\1", line)).strip()
+    words = text.split()
+
+    # Link lists and menus: most of the line is markup, not text.
+    if len(text) < 0.4 * len(line):
+        return True
+
+    # Menu entries and breadcrumbs; headings and short facts like "Revenue: $5bn" stay.
+    if (
+        len(words) <= 3
+        and not line.startswith("#")
+        and not text.endswith((".", "?", "!"))
+        and not any(char.isdigit() for char in text)
+    ):
+        return True
+
+    if len(words) < 20 and BOILERPLATE_PATTERN.search(text):
+        return True
+
+    # Numbers and table rows are data, however few letters they have.
+    if sum(char.isdigit() for char in text) >= 0.1 * len(text):
+        return False
+
+    letters = sum(char.isalpha() for char in text)
+    return letters < 0.5 * len(text)
+
+
+def dedupe_blocks(blocks: list[str]) -> list[str]:
+    seen = set[str]()
+    unique = list[str]()
+
+    for block in blocks:
+        fingerprint = hashlib.sha1(
+            WHITESPACE_PATTERN.sub(" ", block.casefold()).encode()
+        ).hexdigest()
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            unique.append(block)
+
+    return unique
+
+
+def split_chunks(content: str, token_budget: int) -> list[str]:
+    """
+    Splits content on paragraph boundaries into chunks of at most `token_budget`
+    tokens; paragraphs that don't fit in a chunk on their own are hard-split.
+    """
+    max_chars = token_budget * 4
+
+    chunks = list[str]()
+    current = ""
+    for paragraph in content.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def split_passages(blocks: list[str]) -> list[str]:
+    """
+    Packs consecutive blocks into passages of roughly `PASSAGE_WORDS` words;
+    blocks longer than that are cut into several passages.
+    """
+    passages = list[str]()
+    current = list[str]()
+    current_words = 0
+
+    for block in blocks:
+        words = block.split()
+
+        if len(words) > PASSAGE_WORDS:
+            if current:
+                passages.append("\n".join(current))
+                current, current_words = [], 0
+            for start in range(0, len(words), PASSAGE_WORDS):
+                passages.append(" ".join(words[start : start + PASSAGE_WORDS]))
+            continue
+
+        if current_words + len(words) > PASSAGE_WORDS and current:
+            passages.append("\n".join(current))
+            current, current_words = [], 0
+
+        current.append(block)
+        current_words += len(words)
+
+    if current:
+        passages.append("\n".join(current))
+
+    return passages
@@ -0,0 +1,61 @@
+import asyncio
+import collections
+from dataclasses import dataclass, field
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.runtime import Runtime
+
+from search_backend import SearchBackend, default_backend
+from source_registry import SourceRegistry
+import tool_journal
+import utils
+
+# Contexts of runs started without one, by thread ID, most recently used last.
+MAX_RUN_CONTEXTS = 256
+run_contexts = collections.OrderedDict[str, "SillySearchContext"]()
+
+
+@dataclass
+class SillySearchContext:
+    """
+    Run-scoped dependencies, passed to the graph as `context` and inherited by the
+    researcher subgraphs. Runs started without a context get one per thread, see
+    `get_context`.
+    """
+
+    source_registry: SourceRegistry = field(default_factory=SourceRegistry)
+    search_client: SearchBackend = field(default_factory=default_backend)
+    journal: tool_journal.ToolJournal | None = field(
+        default_factory=tool_journal.default_journal
+    )
+    # Background note folding of each researcher, by researcher_id.
+    pending_folds: dict[str, list[asyncio.Task[dict]]] = field(default_factory=dict)
+
+
+def get_context(
+    runtime: Runtime[SillySearchContext], config: RunnableConfig
+) -> SillySearchContext:
+    """
+    The context the run was started with or, when it was started without one (as
+    langgraph.json does), the one shared by every node of the run's thread.
+    """
+    if runtime.context is not None:
+        return runtime.context
+
+    run_id = utils.get_run_id(config)
+    context = run_contexts.get(run_id)
+    if context is None:
+        context = SillySearchContext()
+        run_contexts[run_id] = context
+        while len(run_contexts) > MAX_RUN_CONTEXTS:
+            run_contexts.popitem(last=False)
+    run_contexts.move_to_end(run_id)
+
+    return context
+
+
+def release_context(config: RunnableConfig) -> None:
+    """
+    Forgets the shared context of a finished run.
+    """
+    run_contexts.pop(utils.get_run_id(config), None)
@@ -0,0 +1,167 @@
+import logging
+from collections.abc import Mapping, Sequence
+
+from langchain_core.messages import (
+    AnyMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from pydantic import BaseModel
+
+from config import cfg
+from source_registry import RESULT_HEADER_PATTERN, cited_ids
+
+
+class CompactionReport(BaseModel):
+    tokens_before: int
+    tokens_after: int
+    compacted_messages: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def compact_for_llm(
+    name: str,
+    messages: Sequence[AnyMessage],
+    token_budget: int,
+    notes: Mapping[str, str] | None = None,
+) -> list[AnyMessage]:
+    """
+    The configured compaction for one LLM call; the full history stays in the graph
+    state, only the request gets the compacted copy.
+    """
+    if not cfg.context_compaction_enabled:
+        return list(messages)
+
+    compacted, report = compact_messages(
+        messages,
+        token_budget=token_budget,
+        keep_recent=cfg.compaction_keep_recent_messages,
+        note_tokens=cfg.compaction_note_tokens,
+        notes=notes,
+    )
+    log_report(name, report)
+
+    return compacted
+
+
+def compact_messages(
+    messages: Sequence[AnyMessage],
+    token_budget: int,
+    keep_recent: int,
+    note_tokens: int,
+    notes: Mapping[str, str] | None = None,
+) -> tuple[list[AnyMessage], CompactionReport]:
+    """
+    Keeps a message history under `token_budget` by folding old tool outputs into
+    short notes, oldest first.
+
+    The leading system/human prompt and the last `keep_recent` messages are sent
+    verbatim. Compacted tool messages keep their tool_call_id, so every AI tool call
+    still has its answer. The input list is not modified.
+
+    :param notes: tool_call_id -> notes already written about that output, such as
+        the researcher's running notes; an output with shorter notes is replaced by
+        them, every other output by an excerpt from `fold_into_note`
+    """
+    notes = notes or {}
+    shown_notes = set[str]()
+    token_counts = [count_tokens_approximately([message]) for message in messages]
+    total = sum(token_counts)
+    report = CompactionReport(tokens_before=total, tokens_after=total)
+
+    if total <= token_budget:
+        return list(messages), report
+
+    prompt_end = 0
+    while prompt_end < len(messages) and isinstance(
+        messages[prompt_end], (SystemMessage, HumanMessage)
+    ):
+        prompt_end += 1
+    recent_start = max(prompt_end, len(messages) - keep_recent)
+
+    compacted = list(messages)
+    for i in range(prompt_end, recent_start):
+        if total <= token_budget:
+            break
+
+        message = messages[i]
+        if not isinstance(message, ToolMessage) or token_counts[i] <= note_tokens:
+            continue
+
+        content = notes.get(message.tool_call_id)
+        if content in shown_notes:
+            # Notes cover a whole round of tool calls, they are sent only once.
+            content = "[Earlier tool output, folded into the notes above]"
+        elif content and count_tokens_approximately([content]) < token_counts[i]:
+            shown_notes.add(content)
+            content = f"[Notes on earlier tool outputs]\n{content}"
+        else:
+            content = fold_into_note(message, token_counts[i], note_tokens)
+
+        note = message.model_copy(update={"content": content})
+        note_count = count_tokens_approximately([note])
+
+        compacted[i] = note
+        total -= token_counts[i] - note_count
+        report.compacted_messages += 1
+
+    report.tokens_after = total
+
+    return compacted, report
+
+
+def fold_into_note(message: ToolMessage, tokens: int, note_tokens: int) -> str:
+    """
+    An extractive note of about `note_tokens`. Search outputs keep the header line,
+    and so the source ID, of every result plus an even share of each result's text;
+    other outputs keep their beginning and the source IDs cited after it.
+    """
+    content = str(message.text)
+    max_chars = note_tokens * 4
+
+    headers = list(RESULT_HEADER_PATTERN.finditer(content))
+    if headers:
+        ends = [header.start() for header in headers[1:]] + [len(content)]
+        share = max(
+            0,
+            (max_chars - sum(len(header[0]) + 1 for header in headers)) // len(headers),
+        )
+        results = [
+            f"{header[0]}\n{excerpt(content[header.end() : end], share)}".rstrip()
+            for header, end in zip(headers, ends)
+        ]
+
+        return (
+            f"[Earlier search output compacted from ~{tokens} tokens, "
+            f"{len(headers)} results, beginnings kept]\n" + "\n".join(results)
+        )
+
+    head = excerpt(content, max_chars)
+    more_ids = [source_id for source_id in cited_ids(content) if source_id not in head]
+    cites = f"\nAlso cites: {', '.join(more_ids)}" if more_ids else ""
+
+    return f"[Earlier tool output compacted from ~{tokens} tokens, beginning kept]\n{head}{cites}"
+
+
+def excerpt(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 0:
+        return ""
+
+    return text[:max_chars].rsplit(" ", 1)[0] + " [...]"
+
+
+def log_report(name: str, report: CompactionReport) -> None:
+    if report.compacted_messages:
+        logging.info(
+            f"{name}: compacted {report.compacted_messages} messages, "
+            f"{report.tokens_before} -> {report.tokens_after} tokens "
+            f"({report.tokens_saved} saved)"
+        )
@@ -0,0 +1,84 @@
+import argparse
+import json
+import logging
+import pathlib
+
+from config import cfg
+from local_search.corpus import fingerprint, iter_sources, read_source
+from local_search.index import LocalIndex
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Index a local document corpus for the local search backend.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="JSONL files and directories of text, markdown or HTML files",
+    )
+    parser.add_argument("--index", default=cfg.cache_path(cfg.local_index_path))
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="compact the index into one segment, dropping deleted documents",
+    )
+
+    return parser.parse_args()
+
+
+def update_index(index: LocalIndex, paths: list[str]) -> dict[str, int]:
+    """
+    Brings the index in line with the corpus files under `paths`: new and changed
+    files are (re)indexed, files that disappeared from under `paths` are removed.
+    """
+    indexed = index.sources
+    changed = dict[str, tuple[str, list[dict]]]()
+    seen = set[str]()
+    for path in iter_sources(paths):
+        source = str(path)
+        seen.add(source)
+        source_fingerprint = fingerprint(path)
+        if indexed.get(source, {}).get("fingerprint") == source_fingerprint:
+            continue
+
+        try:
+            changed[source] = (source_fingerprint, read_source(path))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping {path}: {e!r}")
+
+    roots = [str(pathlib.Path(path).resolve()) for path in paths]
+    missing = [
+        source
+        for source in indexed
+        if source not in seen
+        and any(source == root or source.startswith(f"{root}/") for root in roots)
+    ]
+
+    added = index.add(changed) if changed else 0
+    if missing:
+        index.remove(missing)
+
+    return {
+        "sources_indexed": len(changed),
+        "sources_removed": len(missing),
+        "documents_added": added,
+        "sources": len(index.sources),
+    }
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    index = LocalIndex(args.index)
+    report = update_index(index, args.paths)
+    if args.rebuild:
+        index.rebuild()
+    index.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import asyncio
+import functools
+
+from bm25 import tokenize
+from config import cfg
+from local_search.index import LocalIndex
+import metrics
+from search_backend import SearchBackend, Topic
+
+
+class LocalSearchClient(SearchBackend):
+    """
+    Searches a `LocalIndex` instead of the web. Results have the shape of Tavily
+    results: the document text is the raw_content, a passage matching the query
+    the content. The topic is ignored.
+    """
+
+    def __init__(self, index: LocalIndex, snippet_chars: int) -> None:
+        self.__index = index
+        self.__snippet_chars = snippet_chars
+
+    @metrics.instrument("local_search")
+    async def search_one(self, query: str, max_results: int, topic: Topic) -> dict:
+        documents = await asyncio.to_thread(self.__index.search, query, max_results)
+
+        return {
+            "query": query,
+            "results": [
+                {
+                    "url": document["url"],
+                    "title": document["title"],
+                    "content": snippet(
+                        document["content"], query, max_chars=self.__snippet_chars
+                    ),
+                    "raw_content": document["content"],
+                    "score": document["score"],
+                }
+                for document in documents
+            ],
+        }
+
+
+def snippet(text: str, query: str, max_chars: int) -> str:
+    """
+    The paragraph of `text` sharing the most terms with `query`, cut to `max_chars`.
+    """
+    terms = set(tokenize(query))
+    paragraphs = [paragraph for paragraph in text.split("\n") if paragraph.strip()]
+    if not paragraphs:
+        return ""
+
+    best = max(
+        paragraphs,
+        key=lambda paragraph: len(terms.intersection(tokenize(paragraph))),
+    )
+
+    return best.strip()[:max_chars]
+
+
+@functools.cache
+def default_client() -> LocalSearchClient:
+    return LocalSearchClient(
+        index=LocalIndex(cfg.cache_path(cfg.local_index_path)),
+        snippet_chars=cfg.local_search_snippet_chars,
+    )
@@ -0,0 +1,127 @@
+import json
+import os
+import pathlib
+from collections.abc import Iterator
+from html.parser import HTMLParser
+
+TEXT_SUFFIXES = (".txt", ".md")
+HTML_SUFFIXES = (".html", ".htm")
+JSONL_SUFFIXES = (".jsonl",)
+SKIPPED_TAGS = frozenset({"script", "style", "noscript", "template", "svg"})
+BLOCK_TAGS = frozenset(
+    {"p", "div", "br", "li", "tr", "section", "article", "h1", "h2", "h3", "h4"}
+)
+
+
+def iter_sources(paths: list[str]) -> Iterator[pathlib.Path]:
+    """
+    The corpus files under `paths`: JSONL files, one document per line, and text,
+    markdown and HTML files, one document each.
+    """
+    suffixes = TEXT_SUFFIXES + HTML_SUFFIXES + JSONL_SUFFIXES
+    for path in map(pathlib.Path, paths):
+        if path.is_file():
+            yield path.resolve()
+        elif path.is_dir():
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(suffixes):
+                        yield (pathlib.Path(root) / name).resolve()
+
+
+def fingerprint(path: pathlib.Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def read_source(path: pathlib.Path) -> list[dict]:
+    """
+    :return: the documents of a corpus file as {"url", "title", "content"}; files
+        have file:// URLs unless a JSONL line brings its own
+    """
+    suffix = path.suffix.lower()
+    text = path.read_text(encoding="utf-8", errors="replace")
+
+    if suffix in JSONL_SUFFIXES:
+        return read_jsonl(path, text)
+    if suffix in HTML_SUFFIXES:
+        title, content = html_to_text(text)
+        return [{"url": path.as_uri(), "title": title or path.stem, "content": content}]
+
+    return [{"url": path.as_uri(), "title": text_title(text, path), "content": text}]
+
+
+def read_jsonl(path: pathlib.Path, text: str) -> list[dict]:
+    documents = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+
+        record = json.loads(line)
+        content = (
+            record.get("raw_content") or record.get("content") or record.get("text")
+        )
+        if not content:
+            continue
+
+        documents.append(
+            {
+                "url": record.get("url") or f"{path.as_uri()}#L{line_number}",
+                "title": record.get("title") or "",
+                "content": content,
+            }
+        )
+
+    return documents
+
+
+def text_title(text: str, path: pathlib.Path) -> str:
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip().lstrip("#").strip()[:200]
+
+    return path.stem
+
+
+class HTMLTextExtractor(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.parts = list[str]()
+        self.__skipping = 0
+        self.__in_title = False
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in SKIPPED_TAGS:
+            self.__skipping += 1
+        elif tag == "title":
+            self.__in_title = True
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIPPED_TAGS:
+            self.__skipping = max(0, self.__skipping - 1)
+        elif tag == "title":
+            self.__in_title = False
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if self.__in_title:
+            self.title += data
+        elif not self.__skipping:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> tuple[str, str]:
+    """
+    :return: the page title and its visible text, one block per line
+    """
+    parser = HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+
+    lines = (" ".join(line.split()) for line in "".join(parser.parts).splitlines())
+
+    return parser.title.strip(), "\n".join(line for line in lines if line)
@@ -0,0 +1,335 @@
+import array
+import collections
+import heapq
+import json
+import mmap
+import os
+import pathlib
+import shutil
+import threading
+
+from bm25 import idf, term_score, tokenize
+
+MANIFEST = "manifest.json"
+
+
+class Segment:
+    """
+    An immutable batch of indexed documents, stored in its own directory:
+
+    - postings.bin: (doc_id, term frequency) uint32 pairs, grouped by term
+    - terms.json: term -> [first pair, pair count] into postings.bin
+    - lengths.bin: uint32 token count per doc_id
+    - documents.bin: the documents as concatenated JSON, offsets.bin: uint64 start
+      of every document plus the end of the last one
+
+    The binary files are memory-mapped, so only the postings a query touches are
+    paged in.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.__files = list[tuple[object, mmap.mmap]]()
+        self.terms: dict[str, list[int]] = json.loads((path / "terms.json").read_text())
+        self.postings = self.__map(path / "postings.bin", "I")
+        self.lengths = self.__map(path / "lengths.bin", "I")
+        self.offsets = self.__map(path / "offsets.bin", "Q")
+        self.documents = self.__map(path / "documents.bin", "B")
+        self.total_length = sum(self.lengths)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def document_frequency(self, term: str) -> int:
+        entry = self.terms.get(term)
+        return entry[1] if entry else 0
+
+    def term_postings(self, term: str) -> memoryview:
+        entry = self.terms.get(term)
+        if entry is None:
+            return memoryview(b"").cast("I")
+
+        start, count = entry
+        return self.postings[2 * start : 2 * (start + count)]
+
+    def document(self, doc_id: int) -> dict:
+        return json.loads(
+            bytes(self.documents[self.offsets[doc_id] : self.offsets[doc_id + 1]])
+        )
+
+    def close(self) -> None:
+        for view in (self.postings, self.lengths, self.offsets, self.documents):
+            view.release()
+        for file, mapped in self.__files:
+            mapped.close()
+            file.close()  # type: ignore[attr-defined]
+
+    def __map(self, path: pathlib.Path, fmt: str) -> memoryview:
+        if path.stat().st_size == 0:
+            return memoryview(b"").cast(fmt)
+
+        file = path.open("rb")
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__files.append((file, mapped))
+
+        return memoryview(mapped).cast(fmt)
+
+    @staticmethod
+    def write(path: pathlib.Path, documents: list[dict]) -> None:
+        """
+        Writes the segment into a temporary directory and renames it into place, so
+        a crash never leaves a partial segment behind. Whatever is left at `path` or
+        the temporary directory is from an earlier crash and never made it into the
+        manifest, so it is replaced.
+        """
+        temp_path = path.with_name(f"{path.name}.tmp")
+        for stale_path in (temp_path, path):
+            if stale_path.exists():
+                shutil.rmtree(stale_path)
+
+        temp_path.mkdir(parents=True)
+        try:
+            Segment.__write_files(temp_path, documents)
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def __write_files(path: pathlib.Path, documents: list[dict]) -> None:
+        postings = collections.defaultdict[str, list[tuple[int, int]]](list)
+        lengths = array.array("I")
+        offsets = array.array("Q", [0])
+        with (path / "documents.bin").open("wb") as file:
+            for doc_id, document in enumerate(documents):
+                tokens = tokenize(f"{document['title']}\n{document['content']}")
+                lengths.append(len(tokens))
+                for term, frequency in collections.Counter(tokens).items():
+                    postings[term].append((doc_id, frequency))
+
+                data = json.dumps(document, ensure_ascii=False).encode()
+                file.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+        terms = dict[str, list[int]]()
+        pairs = array.array("I")
+        for term, term_postings in postings.items():
+            terms[term] = [len(pairs) // 2, len(term_postings)]
+            for doc_id, frequency in term_postings:
+                pairs.append(doc_id)
+                pairs.append(frequency)
+
+        (path / "postings.bin").write_bytes(pairs.tobytes())
+        (path / "lengths.bin").write_bytes(lengths.tobytes())
+        (path / "offsets.bin").write_bytes(offsets.tobytes())
+        (path / "terms.json").write_text(json.dumps(terms, ensure_ascii=False))
+
+
+class LocalIndex:
+    """
+    On-disk BM25 index over a local document corpus.
+
+    Every `add` writes a new segment and records it in a manifest; replaced or
+    removed documents are only marked deleted, so indexing is incremental and a
+    reader never sees a half-written segment. Readers pick up a new manifest on
+    their next search. Term statistics count deleted documents until `rebuild`.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75) -> None:
+        self.__path = pathlib.Path(path)
+        self.__k1 = k1
+        self.__b = b
+        self.__lock = threading.Lock()
+        self.__manifest = empty_manifest()
+        self.__manifest_mtime_ns = -1
+        self.__segments = dict[str, Segment]()
+
+    @property
+    def sources(self) -> dict[str, dict]:
+        """
+        Source key -> {"fingerprint", "documents": [[segment, doc_id], ...]}
+        """
+        self.__refresh()
+        return self.__manifest["sources"]
+
+    def add(self, sources: dict[str, tuple[str, list[dict]]]) -> int:
+        """
+        Indexes (or re-indexes) whole sources, replacing what they held before.
+
+        :param sources: source key -> (fingerprint, documents)
+        :return: the number of documents added
+        """
+        with self.__lock:
+            self.__refresh()
+            manifest = self.__manifest
+
+            documents = list[dict]()
+            segment = f"segment-{manifest['next_segment']:06d}"
+            new_sources = dict[str, dict]()
+            for source, (source_fingerprint, source_documents) in sources.items():
+                new_sources[source] = {
+                    "fingerprint": source_fingerprint,
+                    "documents": [
+                        [segment, len(documents) + i]
+                        for i in range(len(source_documents))
+                    ],
+                }
+                documents.extend(source_documents)
+
+            if documents:
+                Segment.write(self.__path / segment, documents)
+                manifest["segments"].append(segment)
+                manifest["next_segment"] += 1
+
+            self.__delete(list(sources))
+            manifest["sources"].update(new_sources)
+            self.__write_manifest()
+
+            return len(documents)
+
+    def remove(self, sources: list[str]) -> None:
+        with self.__lock:
+            self.__refresh()
+            self.__delete(sources)
+            self.__write_manifest()
+
+    def rebuild(self) -> None:
+        """
+        Rewrites the live documents into one segment, dropping deleted ones.
+        """
+        with self.__lock:
+            self.__refresh()
+            sources = {
+                source: (
+                    entry["fingerprint"],
+                    [
+                        self.__segment(segment).document(doc_id)
+                        for segment, doc_id in entry["documents"]
+                    ],
+                )
+                for source, entry in self.__manifest["sources"].items()
+            }
+            old_segments = self.__manifest["segments"]
+            self.__manifest = {
+                **empty_manifest(),
+                "next_segment": self.__manifest["next_segment"],
+            }
+
+        self.add(sources)
+
+        with self.__lock:
+            for segment in old_segments:
+                self.__drop_segment(segment)
+
+    def search(self, query: str, max_results: int) -> list[dict]:
+        """
+        :return: the best matching documents, best first, as
+            {"url", "title", "content", "score"} where content is the full text
+        """
+        with self.__lock:
+            return self.__search(query, max_results)
+
+    def close(self) -> None:
+        with self.__lock:
+            for segment in self.__segments.values():
+                segment.close()
+            self.__segments.clear()
+
+    def __search(self, query: str, max_results: int) -> list[dict]:
+        self.__refresh()
+        manifest = self.__manifest
+        segments = [(name, self.__segment(name)) for name in manifest["segments"]]
+
+        terms = set(tokenize(query))
+        deleted = {name: set(ids) for name, ids in manifest["deleted"].items()}
+        documents_count = sum(len(segment) for _, segment in segments)
+        if not terms or not documents_count:
+            return []
+
+        avg_length = sum(segment.total_length for _, segment in segments) / (
+            documents_count
+        )
+        term_idf = {
+            term: idf(
+                documents_count,
+                sum(segment.document_frequency(term) for _, segment in segments),
+            )
+            for term in terms
+        }
+
+        scores = collections.defaultdict[tuple[str, int], float](float)
+        for name, segment in segments:
+            segment_deleted = deleted.get(name, set())
+            for term in terms:
+                postings = segment.term_postings(term)
+                for i in range(0, len(postings), 2):
+                    doc_id = postings[i]
+                    if doc_id in segment_deleted:
+                        continue
+
+                    scores[(name, doc_id)] += term_idf[term] * term_score(
+                        postings[i + 1],
+                        segment.lengths[doc_id],
+                        avg_length,
+                        k1=self.__k1,
+                        b=self.__b,
+                    )
+
+        best = heapq.nlargest(max_results, scores.items(), key=lambda item: item[1])
+
+        return [
+            {**self.__segment(name).document(doc_id), "score": score}
+            for (name, doc_id), score in best
+        ]
+
+    def __segment(self, name: str) -> Segment:
+        segment = self.__segments.get(name)
+        if segment is None:
+            segment = Segment(self.__path / name)
+            self.__segments[name] = segment
+
+        return segment
+
+    def __refresh(self) -> None:
+        path = self.__path / MANIFEST
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        if mtime_ns != self.__manifest_mtime_ns:
+            self.__manifest = json.loads(path.read_text())
+            self.__manifest_mtime_ns = mtime_ns
+
+            # Segments merged away by a rebuild elsewhere.
+            for name in set(self.__segments) - set(self.__manifest["segments"]):
+                self.__segments.pop(name).close()
+
+    def __delete(self, sources: list[str]) -> None:
+        manifest = self.__manifest
+        for source in sources:
+            entry = manifest["sources"].pop(source, None)
+            for segment, doc_id in entry["documents"] if entry else []:
+                manifest["deleted"].setdefault(segment, []).append(doc_id)
+
+    def __write_manifest(self) -> None:
+        self.__path.mkdir(parents=True, exist_ok=True)
+        path = self.__path / MANIFEST
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self.__manifest))
+        os.replace(temp_path, path)
+        self.__manifest_mtime_ns = path.stat().st_mtime_ns
+
+    def __drop_segment(self, name: str) -> None:
+        segment = self.__segments.pop(name, None)
+        if segment is not None:
+            segment.close()
+
+        directory = self.__path / name
+        for file in directory.iterdir():
+            file.unlink()
+        directory.rmdir()
+
+
+def empty_manifest() -> dict:
+    return {"segments": [], "next_segment": 0, "sources": {}, "deleted": {}}
@@ -1,9 +1,11 @@
 from functools import partial
 from langgraph.graph.state import StateGraph
-from langgraph.checkpoint.memory import InMemorySaver
 import dotenv
 
 import asyncio
+from checkpointer import default_checkpointer
+from config import cfg
+from context import SillySearchContext
 from supervisor import supervisor_state as supervisor_state
 from researcher import researcher_state as researcher_state
 import supervisor.supervisor as supervisor
@@ -13,17 +15,27 @@ import researcher.researcher as researcher
 async def main():
     dotenv.load_dotenv()
 
-    checkpointer = InMemorySaver()
+    checkpointer = default_checkpointer()
 
-    researcher_graph = StateGraph(state_schema=researcher_state.ResearcherState)
+    researcher_graph = StateGraph(
+        state_schema=researcher_state.ResearcherState,
+        context_schema=SillySearchContext,
+    )
     researcher_graph.add_node(researcher.research)
     researcher_graph.add_node(researcher.handle_researcher_tools)
     researcher_graph.add_node(researcher.compress_research)
     researcher_graph.add_edge("__start__", researcher.research.__name__)
 
-    researcher_graph = researcher_graph.compile(checkpointer=checkpointer)
+    # Researchers run to completion inside a single supervisor step, so their
+    # checkpoints are only useful for debugging.
+    researcher_graph = researcher_graph.compile(
+        checkpointer=checkpointer if cfg.researcher_checkpointing_enabled else False
+    )
 
-    supervisor_graph = StateGraph(state_schema=supervisor_state.SillySearchState)
+    supervisor_graph = StateGraph(
+        state_schema=supervisor_state.SillySearchState,
+        context_schema=SillySearchContext,
+    )
 
     supervisor_graph.add_node(supervisor.clarify_user_request)
     supervisor_graph.add_node(supervisor.write_research_brief)
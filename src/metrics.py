@@ -0,0 +1,373 @@
+import bisect
+import collections
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import typing
+from collections.abc import Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langgraph.config import get_config
+
+from config import cfg
+
+SECONDS_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+TOKENS_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1)
+
+MAX_TRACKED_RUNS = 256
+
+current_operation = contextvars.ContextVar[str]("current_operation", default="unknown")
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class OperationSummary:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.max_wall_seconds = 0.0
+        self.queue_seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class MetricsRegistry:
+    """
+    Process-wide histograms and counters, plus a per-run breakdown by operation.
+
+    A run is identified by the LangGraph thread_id of the current invocation. Every
+    method is a no-op when metrics are disabled.
+    """
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.__lock = threading.Lock()
+        self.__histograms = dict[tuple[str, tuple], Histogram]()
+        self.__counters = collections.defaultdict[tuple[str, tuple], float](float)
+        self.__gauges = dict[tuple[str, tuple], float]()
+        self.__runs = collections.OrderedDict[
+            str, collections.defaultdict[str, OperationSummary]
+        ]()
+
+    def observe(
+        self, name: str, value: float, buckets: tuple[float, ...], **labels: str
+    ) -> None:
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            self.__counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            self.__gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def operation(self) -> OperationSummary:
+        """
+        :return: the summary of the current operation in the current run
+        """
+        run_id = current_run_id()
+        with self.__lock:
+            run = self.__runs.get(run_id)
+            if run is None:
+                run = self.__runs[run_id] = collections.defaultdict(OperationSummary)
+                while len(self.__runs) > MAX_TRACKED_RUNS:
+                    self.__runs.popitem(last=False)
+            else:
+                self.__runs.move_to_end(run_id)
+
+            return run[current_operation.get()]
+
+    def run_summary(self, run_id: str) -> dict[str, typing.Any] | None:
+        with self.__lock:
+            run = self.__runs.get(run_id)
+            if run is None:
+                return None
+
+            return {
+                "run_id": run_id,
+                "operations": {
+                    name: dict(vars(summary)) for name, summary in run.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        lines = list[str]()
+        typed = set[str]()
+
+        def declare(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self.__lock:
+            for (name, labels), value in sorted(self.__counters.items()):
+                declare(name, "counter")
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for (name, labels), value in sorted(self.__gauges.items()):
+                declare(name, "gauge")
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for (name, labels), histogram in sorted(
+                self.__histograms.items(), key=lambda item: item[0]
+            ):
+                declare(name, "histogram")
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    bucket_labels = (*labels, ("le", str(bound)))
+                    lines.append(
+                        f"{name}_bucket{format_labels(bucket_labels)} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(enabled=cfg.metrics_enabled)
+
+
+def instrument[**P, T](
+    operation: str,
+) -> Callable[[Callable[P, typing.Awaitable[T]]], Callable[P, typing.Awaitable[T]]]:
+    """
+    Records wall time, call and error counts of an async function under `operation`.
+    LLM tokens, retries, queue waits and cache lookups made while it runs are
+    attributed to it as well. Returns the function untouched when metrics are off.
+    """
+
+    def decorator(
+        fn: Callable[P, typing.Awaitable[T]],
+    ) -> Callable[P, typing.Awaitable[T]]:
+        if not registry.enabled:
+            return fn
+
+        @functools.wraps(fn)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            token = current_operation.set(operation)
+            started_at = time.perf_counter()
+            status = "ok"
+            try:
+                return await fn(*args, **kwargs)
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                elapsed = time.perf_counter() - started_at
+                registry.observe(
+                    "silly_search_operation_seconds",
+                    elapsed,
+                    SECONDS_BUCKETS,
+                    operation=operation,
+                )
+                registry.increment(
+                    "silly_search_operation_calls_total",
+                    operation=operation,
+                    status=status,
+                )
+                summary = registry.operation()
+                summary.calls += 1
+                if status == "error":
+                    summary.errors += 1
+                summary.wall_seconds += elapsed
+                summary.max_wall_seconds = max(summary.max_wall_seconds, elapsed)
+                current_operation.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def record_queue_time(queue: str, seconds: float, **labels: str) -> None:
+    if not registry.enabled:
+        return
+
+    registry.observe(
+        "silly_search_queue_seconds", seconds, SECONDS_BUCKETS, queue=queue, **labels
+    )
+    registry.operation().queue_seconds += seconds
+
+
+def record_novelty(score: float) -> None:
+    registry.observe("silly_search_search_round_novelty", score, RATIO_BUCKETS)
+
+
+def record_concurrency_limit(limiter: str, limit: int) -> None:
+    registry.set_gauge("silly_search_concurrency_limit", limit, limiter=limiter)
+
+
+def record_concurrency_backoff(
+    limiter: str, reason: typing.Literal["overload", "latency"]
+) -> None:
+    registry.increment(
+        "silly_search_concurrency_backoffs_total", limiter=limiter, reason=reason
+    )
+
+
+def record_call_timeout(endpoint: str) -> None:
+    registry.increment("silly_search_call_timeouts_total", endpoint=endpoint)
+
+
+def record_hedge(endpoint: str, winner: typing.Literal["primary", "hedge"]) -> None:
+    registry.increment(
+        "silly_search_hedged_calls_total", endpoint=endpoint, winner=winner
+    )
+
+
+def record_llm_retry(endpoint: str) -> None:
+    if not registry.enabled:
+        return
+
+    registry.increment(
+        "silly_search_llm_retries_total",
+        operation=current_operation.get(),
+        endpoint=endpoint,
+    )
+    registry.operation().retries += 1
+
+
+def record_speculation(
+    outcome: typing.Literal["used", "discarded", "failed"],
+) -> None:
+    registry.increment("silly_search_speculations_total", outcome=outcome)
+
+
+def record_near_duplicate() -> None:
+    registry.increment("silly_search_near_duplicate_pages_total")
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    if not registry.enabled:
+        return
+
+    registry.increment(
+        "silly_search_cache_lookups_total", cache=cache, result="hit" if hit else "miss"
+    )
+    summary = registry.operation()
+    if hit:
+        summary.cache_hits += 1
+    else:
+        summary.cache_misses += 1
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Counts tokens of every model call, attributed to the operation that made it.
+    """
+
+    run_inline = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs: typing.Any) -> None:
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+
+        operation = current_operation.get()
+        registry.observe(
+            "silly_search_llm_input_tokens",
+            input_tokens,
+            TOKENS_BUCKETS,
+            operation=operation,
+        )
+        registry.observe(
+            "silly_search_llm_output_tokens",
+            output_tokens,
+            TOKENS_BUCKETS,
+            operation=operation,
+        )
+
+        summary = registry.operation()
+        summary.input_tokens += input_tokens
+        summary.output_tokens += output_tokens
+
+
+llm_metrics_handler = LLMMetricsHandler()
+
+
+def write_run_summary(run_id: str) -> None:
+    if not registry.enabled or not cfg.metrics_run_summary_dir:
+        return
+
+    summary = registry.run_summary(run_id)
+    if summary is None:
+        return
+
+    os.makedirs(cfg.metrics_run_summary_dir, exist_ok=True)
+    with open(os.path.join(cfg.metrics_run_summary_dir, f"{run_id}.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+def current_run_id() -> str:
+    try:
+        return str(get_config().get("configurable", {}).get("thread_id", "default"))
+    except RuntimeError:
+        return "default"
+
+
+def format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
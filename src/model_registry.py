@@ -0,0 +1,236 @@
+import threading
+import typing
+from collections.abc import Callable, Sequence
+
+import httpx
+from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+from call_policy import call_policy
+from concurrency import AdaptiveLimiter
+from config import ModelRole, ModelSettings, cfg, run_config
+import metrics
+from scheduling import Priority
+
+ROLE_PRIORITIES: dict[ModelRole, Priority] = {
+    "clarifier": "critical",
+    "brief_writer": "critical",
+    "supervisor": "critical",
+    "compressor": "critical",
+    "researcher": "research",
+    "summarizer": "bulk",
+}
+
+
+class ModelRegistry:
+    """
+    Builds every (model settings, tools, schema) variant once and hands out the same
+    runnable afterwards. All variants share one keep-alive HTTP connection pool.
+
+    Building a variant never awaits, so concurrent asyncio tasks can't interleave in
+    the middle of it; the lock only matters for callers on other threads.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry_sec: float,
+        chat_model_factory: Callable[..., BaseChatModel] = init_chat_model,
+    ) -> None:
+        self.__api_key = api_key
+        self.__chat_model_factory = chat_model_factory
+        self.__limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_sec,
+        )
+        self.__http_client: httpx.Client | None = None
+        self.__http_async_client: httpx.AsyncClient | None = None
+        self.__models = dict[tuple, Runnable]()
+        self.__lock = threading.Lock()
+
+    def get(
+        self,
+        settings: ModelSettings,
+        tools: Sequence[typing.Any] | None = None,
+        schema: type[BaseModel] | None = None,
+        priority: Priority = "research",
+    ) -> Runnable:
+        if tools and schema:
+            # with_structured_output binds the schema as a tool of its own and would
+            # drop the others.
+            raise ValueError("a model takes either tools or an output schema")
+
+        key = (
+            settings,
+            tuple(tool_name(tool) for tool in tools or []),
+            schema,
+            priority,
+        )
+
+        runnable = self.__models.get(key)
+        if runnable is not None:
+            return runnable
+
+        with self.__lock:
+            runnable = self.__models.get(key)
+            if runnable is None:
+                runnable = self.__build(settings, tools, schema, priority)
+                self.__models[key] = runnable
+
+        return runnable
+
+    def __build(
+        self,
+        settings: ModelSettings,
+        tools: Sequence[typing.Any] | None,
+        schema: type[BaseModel] | None,
+        priority: Priority,
+    ) -> Runnable:
+        if self.__http_async_client is None:
+            self.__http_client = httpx.Client(limits=self.__limits)
+            self.__http_async_client = httpx.AsyncClient(limits=self.__limits)
+
+        kwargs = dict[str, typing.Any]()
+        if settings.timeout_sec is not None:
+            kwargs["timeout"] = settings.timeout_sec
+        if settings.max_tokens is not None:
+            kwargs["max_tokens"] = settings.max_tokens
+
+        llm = self.__chat_model_factory(
+            model=settings.model,
+            api_key=self.__api_key,
+            http_client=self.__http_client,
+            http_async_client=self.__http_async_client,
+            **kwargs,
+        )
+
+        runnable: Runnable = llm
+        if tools:
+            runnable = llm.bind_tools(tools)
+        elif schema:
+            runnable = llm.with_structured_output(schema)
+
+        runnable = with_call_policy(
+            runnable,
+            endpoint=endpoint_name(settings, tools, schema),
+            priority=priority,
+            max_attempts=settings.max_retries,
+        )
+        if metrics.registry.enabled:
+            runnable = runnable.with_config(callbacks=[metrics.llm_metrics_handler])
+
+        return runnable
+
+
+def get_model(
+    role: ModelRole,
+    tools: Sequence[typing.Any] | None = None,
+    schema: type[BaseModel] | None = None,
+    priority: Priority | None = None,
+) -> Runnable:
+    """
+    The model configured for `role` in the current run.
+
+    :param priority: overrides the role's priority, for calls off the role's usual
+        path
+    """
+    return models.get(
+        run_config().model_settings(role),
+        tools=tools,
+        schema=schema,
+        priority=priority or ROLE_PRIORITIES[role],
+    )
+
+
+def with_call_policy(
+    runnable: Runnable, endpoint: str, priority: Priority, max_attempts: int
+) -> Runnable:
+    """
+    Runs every attempt of `runnable` under the call policy of `endpoint` and in a
+    slot of the shared LLM limiter, queueing at `priority`; a hedged duplicate
+    queues for a slot of its own. Both sit inside the retries, so a policy timeout
+    is retried like any other error and the limiter sees every rate limit.
+
+    `Runnable.with_retry` doesn't tell callbacks about retries, so every attempt
+    after the first is counted here.
+    """
+    policy = call_policy(endpoint)
+
+    def slot() -> typing.AsyncContextManager[float]:
+        return llm_limiter.slot(endpoint, priority=priority)
+
+    async def invoke(input: typing.Any, config: RunnableConfig) -> typing.Any:
+        attempts = 0
+
+        async def attempt(input: typing.Any, config: RunnableConfig) -> typing.Any:
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1:
+                metrics.record_llm_retry(endpoint)
+
+            async with slot():
+                return await policy.run(
+                    lambda: runnable.ainvoke(input, config), hedge_slot=slot
+                )
+
+        retried = RunnableLambda(attempt, name=endpoint).with_retry(
+            stop_after_attempt=max_attempts
+        )
+        return await retried.ainvoke(input, config)
+
+    return RunnableLambda(invoke, name=endpoint)
+
+
+def endpoint_name(
+    settings: ModelSettings,
+    tools: Sequence[typing.Any] | None,
+    schema: type[BaseModel] | None,
+) -> str:
+    """
+    Calls of one model are told apart by shape, a summary takes far longer than a
+    tool call.
+    """
+    if schema:
+        shape = schema.__name__
+    elif tools:
+        shape = ",".join(sorted(tool_name(tool) for tool in tools))
+    else:
+        shape = "chat"
+
+    return f"llm:{settings.model}:{shape}"
+
+
+def tool_name(tool: typing.Any) -> str:
+    return getattr(tool, "name", None) or tool.__name__
+
+
+# Every LLM call of the process queues here. Without adaptive concurrency the limit
+# stays at the connection pool size and only the queueing order is managed.
+llm_limiter = AdaptiveLimiter(
+    "llm",
+    initial_limit=(
+        cfg.llm_initial_concurrency
+        if cfg.adaptive_concurrency_enabled
+        else cfg.llm_max_connections
+    ),
+    min_limit=(
+        cfg.llm_min_concurrency
+        if cfg.adaptive_concurrency_enabled
+        else cfg.llm_max_connections
+    ),
+    max_limit=cfg.llm_max_connections,
+    backoff_factor=cfg.adaptive_concurrency_backoff_factor,
+    latency_tolerance=cfg.adaptive_concurrency_latency_tolerance,
+    priority_aging_sec=cfg.priority_aging_sec,
+)
+models = ModelRegistry(
+    api_key=cfg.xai_api_key,
+    max_connections=cfg.llm_max_connections,
+    max_keepalive_connections=cfg.llm_max_keepalive_connections,
+    keepalive_expiry_sec=cfg.llm_keepalive_expiry_sec,
+)
@@ -242,6 +242,114 @@ Remember, your goal is to create a summary that can be easily understood and uti
 Today's date is {date}.
 """
 
+summary_reduce_prompt = """You are tasked with merging several partial summaries of one webpage into a single summary. The webpage was too long to summarize at once, so it was split into consecutive chunks and each chunk was summarized separately. This summary will be used by a downstream research agent, so it's crucial to maintain the key details without losing essential information.
+
+Here are the partial summaries, in the order the chunks appear on the webpage:
+
+<partial_summaries>
+{partial_summaries}
+</partial_summaries>
+
+Please follow these guidelines to create your summary:
+
+1. Identify and preserve the main topic or purpose of the webpage.
+2. Keep every key fact, statistic, data point, date, name and location from the partial summaries.
+3. Merge information that is repeated across partial summaries instead of listing it twice.
+4. Maintain the order of events and arguments as they appear on the webpage.
+5. Do not add information that is not present in the partial summaries.
+
+Present your summary in the following format:
+
+```
+{{
+   "summary": "Your merged summary here, structured with appropriate paragraphs or bullet points as needed",
+   "key_excerpts": "The most important quotes or excerpts from the partial summaries, up to a maximum of 5"
+}}
+```
+
+Today's date is {date}.
+"""
+
+batch_summarizer_prompt = """You are tasked with summarizing the raw content of several webpages retrieved from a web search. Your goal is to create, for every webpage, a summary that preserves the most important information from it. These summaries will be used by a downstream research agent, so it's crucial to maintain the key details without losing essential information.
+
+Here are the webpages, each with its id:
+
+{webpages}
+
+Please follow these guidelines to create each summary:
+
+1. Summarize every webpage on its own; never mix information from different webpages.
+2. Identify and preserve the main topic or purpose of the webpage.
+3. Retain key facts, statistics, and data points that are central to the content's message.
+4. Keep important quotes from credible sources or experts.
+5. Maintain the chronological order of events if the content is time-sensitive or historical.
+6. Include relevant dates, names, and locations that are crucial to understanding the content.
+7. Aim for about 25-30 percent of the original length, unless the content is already concise.
+
+Return one entry per webpage, using the webpage's id:
+
+```
+{{
+   "summaries": [
+      {{
+         "id": "The id of the webpage",
+         "summary": "Your summary here, structured with appropriate paragraphs or bullet points as needed",
+         "key_excerpts": "First important quote or excerpt, Second important quote or excerpt, ...up to a maximum of 5"
+      }}
+   ]
+}}
+```
+
+Today's date is {date}.
+"""
+
+research_notes_prompt = """You are a research assistant keeping running notes for an AI researcher. The researcher is working on the following topic:
+
+<research_topic>
+{research_topic}
+</research_topic>
+
+The researcher just made these tool calls:
+
+<tool_calls>
+{tool_calls}
+</tool_calls>
+
+And received these results:
+
+<tool_outputs>
+{tool_outputs}
+</tool_outputs>
+
+Rewrite the results as clean notes that a later step will merge with notes from other rounds into the final findings. For context, today's date is {date}.
+
+<guidelines>
+1. List the queries and tool calls that were made.
+2. Preserve every relevant fact, statistic, date, name and quote verbatim; only drop information that is obviously irrelevant or duplicated.
+3. Keep the researcher's reflections, they explain what was missing and why the next searches were made.
+4. Attach every piece of information to the source it came from. Cite sources that have an ID, such as [S3F9KQ], by that ID exactly as written; list any other source with its title and URL.
+</guidelines>
+"""
+
+research_notes_merge_prompt = """The researcher worked on the following topic:
+
+<research_topic>
+{research_topic}
+</research_topic>
+
+Notes taken after each round of tool calls:
+
+<research_notes>
+{notes}
+</research_notes>
+
+Results of the final round, not yet in the notes:
+
+<tool_outputs>
+{tool_outputs}
+</tool_outputs>
+"""
+
 research_compressor_system_prompt = """You are a research assistant that has conducted research on a topic by calling several tools and web searches. Your job is now to clean up the findings, but preserve all of the relevant statements and information that the researcher has gathered. For context, today's date is {date}.
 
 <task>
@@ -268,17 +376,28 @@ The report should be structured like this:
 **List of All Relevant Sources (with citations in the report)**
 </output_format>
 
-<citation_rules>
+{citation_rules}
+
+Critical Reminder: It is extremely important that any information that is even remotely relevant to the user's research topic is preserved verbatim (e.g. don't rewrite it, don't summarize it, don't paraphrase it).
+"""
+numbered_citation_rules = """<citation_rules>
 - Assign each unique URL a single citation number in your text
 - End with ### Sources that lists each source with corresponding numbers
 - IMPORTANT: Number sources sequentially without gaps (1,2,3,4...) in the final list regardless of which sources you choose
 - Example format:
   [1] Source Title: URL
   [2] Source Title: URL
-</citation_rules>
+</citation_rules>"""
+
+source_id_citation_rules = """<citation_rules>
+- Search results are labelled with a source ID in square brackets, such as [S3F9KQ]. Cite a source with its ID, copied exactly, in your text
+- Do not write out URLs for sources that have an ID, they are attached to the final report automatically
+- End with ### Sources that lists each cited ID with its source title
+- Example format:
+  [S3F9KQ] Source Title
+  [SW81ZD] Source Title
+</citation_rules>"""
 
-Critical Reminder: It is extremely important that any information that is even remotely relevant to the user's research topic is preserved verbatim (e.g. don't rewrite it, don't summarize it, don't paraphrase it).
-"""
 research_compressor_human_prompt = """All above messages are about research conducted by an AI Researcher. Please clean up these findings.
 
 DO NOT summarize the information. I want the raw information returned, just in a cleaner format. Make sure all relevant information is preserved - you can rewrite findings verbatim."""
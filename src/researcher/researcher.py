@@ -1,32 +1,49 @@
 import asyncio
+import logging
 import typing
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+import uuid
+from langchain_core.messages import (
+    AIMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolCall,
+    ToolMessage,
+)
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
+from langgraph.runtime import Runtime
 from langgraph.types import Command
 import researcher.researcher_state as researcher_state
 from config import cfg
+from model_registry import get_model
+from context import SillySearchContext, get_context
+import context_compaction
+import metrics
 import researcher.researcher_tools as researcher_tools
 import common_tools
 import prompts
+import source_registry
+import tool_journal
 import utils
 
 
+@metrics.instrument("research")
 async def research(
     state: researcher_state.ResearcherState,
+    config: RunnableConfig,
+    runtime: Runtime[SillySearchContext],
 ) -> Command[typing.Literal["handle_researcher_tools"]]:
+    context = get_context(runtime, config)
+    researcher_id = state.get("researcher_id") or uuid.uuid4().hex
+    # Notes folded in the background so far; the rest are picked up later.
+    folded = collect_folds(context, researcher_id)
 
     available_tools = [
         researcher_tools.search,
         common_tools.think,
         common_tools.ResearchCompleteTool,
     ]
-    llm = (
-        init_chat_model(model=cfg.xai_model_name, api_key=cfg.xai_api_key)
-        .bind_tools(available_tools)
-        .with_retry(stop_after_attempt=cfg.max_llm_retries)
-    )
+    llm = get_model("researcher", tools=available_tools)
 
     system_prompt = prompts.researcher_system_prompt.format(
         date=utils.get_readable_date(),
@@ -41,20 +58,35 @@ async def research(
     else:
         messages = state.get("researcher_messages")
 
-    response = await llm.ainvoke(messages)
+    response = await llm.ainvoke(
+        context_compaction.compact_for_llm(
+            "researcher",
+            messages,
+            token_budget=cfg.researcher_context_token_budget,
+            notes={**state.get("folded_notes", {}), **folded["folded_notes"]},
+        )
+    )
 
     return Command(
         goto="handle_researcher_tools",
         update={
+            **folded,
+            "researcher_id": researcher_id,
             "researcher_messages": messages + [response],
             "researcher_iterations": state.get("researcher_iterations", 0) + 1,
         },
     )
 
 
+@metrics.instrument("handle_researcher_tools")
 async def handle_researcher_tools(
     state: researcher_state.ResearcherState,
+    config: RunnableConfig,
+    runtime: Runtime[SillySearchContext],
 ) -> Command[typing.Literal["research", "compress_research"]]:
+    context = get_context(runtime, config)
+    # Sources cited by earlier rounds, in case this run resumed in a new process.
+    context.source_registry.restore(state.get("sources", {}))
     latest_message = state.get("researcher_messages")[-1]
 
     latest_message = typing.cast(AIMessage, latest_message)
@@ -71,14 +103,20 @@ async def handle_researcher_tools(
     ]
 
     tool_call_tasks = [
-        utils.run_safe(
-            (
-                researcher_tools.search.ainvoke
-                if call["name"] == researcher_tools.search.name
-                else common_tools.think.ainvoke
-            ),
-            msg=f"Error when caling a tool {call['name']}",
-            input=call,
+        (
+            utils.run_safe(
+                run_search,
+                msg=f"Error when caling a tool {call['name']}",
+                call=call,
+                context=context,
+                run_id=utils.get_run_id(config),
+            )
+            if call["name"] == researcher_tools.search.name
+            else utils.run_safe(
+                common_tools.think.ainvoke,
+                msg=f"Error when caling a tool {call['name']}",
+                input=call["args"],
+            )
         )
         for call in tool_calls
     ]
@@ -90,35 +128,215 @@ async def handle_researcher_tools(
         for result, call in zip(awaited_tool_call_tasks, tool_calls)
     ]
 
+    novelty, signatures = await asyncio.to_thread(
+        researcher_tools.measure_novelty,
+        [
+            result
+            for result, call in zip(awaited_tool_call_tasks, tool_calls)
+            if call["name"] == researcher_tools.search.name
+        ],
+        state.get("seen_signatures", []),
+    )
+    new_scores = [] if novelty is None else [novelty]
+    novelty_scores = [*state.get("novelty_scores", []), *new_scores]
+    if novelty is not None:
+        metrics.record_novelty(novelty)
+        logging.info(f"Search round {len(novelty_scores)} novelty {novelty:.2f}")
+
+    update = {
+        "researcher_messages": tool_outputs,
+        "seen_signatures": signatures,
+        "novelty_scores": new_scores,
+        "sources": context.source_registry.lookup(
+            source_registry.cited_ids("\n\n".join(awaited_tool_call_tasks))
+        ),
+    }
+
     has_exceeded_max_calls = (
         state.get("researcher_iterations") > cfg.max_researcher_iterations
     )
-    if has_finished or has_exceeded_max_calls:
-        return Command(
-            goto="compress_research", update={"researcher_messages": tool_outputs}
+    has_stalled = cfg.novelty_early_stop_enabled and is_stalled(novelty_scores)
+    if has_stalled:
+        logging.info(
+            f"Stopping research early, the last {cfg.novelty_patience_rounds} search "
+            f"rounds had novelty below {cfg.novelty_threshold}"
+        )
+
+    if has_finished or has_exceeded_max_calls or has_stalled:
+        return Command(goto="compress_research", update=update)
+
+    if cfg.incremental_compression_enabled and tool_outputs:
+        # Folding this round's outputs runs in the background, outside the graph
+        # step, so the next research step doesn't wait for it.
+        context.pending_folds.setdefault(state["researcher_id"], []).append(
+            asyncio.create_task(
+                fold_research_notes(
+                    research_topic=state.get("research_topic"),
+                    tool_calls=latest_message.tool_calls,
+                    tool_outputs=tool_outputs,
+                )
+            )
+        )
+
+    return Command(goto="research", update=update)
+
+
+def is_stalled(novelty_scores: list[float]) -> bool:
+    recent = novelty_scores[-cfg.novelty_patience_rounds :]
+
+    return len(recent) == cfg.novelty_patience_rounds and all(
+        score < cfg.novelty_threshold for score in recent
+    )
+
+
+async def run_search(call: ToolCall, context: SillySearchContext, run_id: str) -> str:
+    key = tool_journal.journal_key(run_id, call["id"])
+
+    def search() -> typing.Awaitable[str]:
+        return researcher_tools.search.ainvoke(
+            {
+                **call["args"],
+                "source_registry": context.source_registry,
+                "search_client": context.search_client,
+                "journal": context.journal,
+                "journal_key": key,
+            }
         )
 
-    return Command(goto="research", update={"researcher_messages": tool_outputs})
+    if context.journal is None:
+        return await search()
+
+    async def packed_search() -> str:
+        return source_registry.pack_output(await search(), context.source_registry)
+
+    return source_registry.unpack_output(
+        await context.journal.run(key, packed_search), context.source_registry
+    )
+
+
+@metrics.instrument("fold_research_notes")
+async def fold_research_notes(
+    research_topic: str, tool_calls: list[ToolCall], tool_outputs: list[ToolMessage]
+) -> dict:
+    """
+    Rewrites one round of tool outputs as notes.
+
+    :return: a researcher state update, empty if folding failed
+    """
+    # Off the critical path until compress_research waits for it, so it queues with
+    # researcher turns rather than ahead of them, and not behind summaries either.
+    llm = get_model("compressor", priority="research")
 
+    prompt = prompts.research_notes_prompt.format(
+        research_topic=research_topic,
+        tool_calls="\n".join(f"{call['name']}: {call['args']}" for call in tool_calls),
+        tool_outputs="\n\n".join(str(message.text) for message in tool_outputs),
+        date=utils.get_readable_date(),
+    )
+
+    try:
+        response = await llm.ainvoke([HumanMessage(content=prompt)])
+    except Exception as e:
+        # The outputs stay unfolded and compress_research will read them raw.
+        logging.warning(f"Folding research notes failed due to error {str(e)}")
+        return {}
+
+    notes = str(response.content)
+
+    return {
+        "raw_notes": [notes],
+        "folded_tool_call_ids": [message.tool_call_id for message in tool_outputs],
+        # Lets later research turns send the notes instead of the outputs.
+        "folded_notes": {message.tool_call_id: notes for message in tool_outputs},
+    }
+
+
+def collect_folds(context: SillySearchContext, researcher_id: str) -> dict:
+    """
+    Takes the finished background folds of a researcher.
 
+    :return: their researcher state updates, merged
+    """
+    pending = context.pending_folds.pop(researcher_id, [])
+    running = [task for task in pending if not task.done()]
+    if running:
+        context.pending_folds[researcher_id] = running
+
+    folded = {"raw_notes": [], "folded_tool_call_ids": [], "folded_notes": {}}
+    for task in pending:
+        if not task.done() or task.cancelled() or task.exception() is not None:
+            continue
+
+        update = task.result()
+        folded["raw_notes"] += update.get("raw_notes", [])
+        folded["folded_tool_call_ids"] += update.get("folded_tool_call_ids", [])
+        folded["folded_notes"] |= update.get("folded_notes", {})
+
+    return folded
+
+
+@metrics.instrument("compress_research")
 async def compress_research(
     state: researcher_state.ResearcherState,
+    config: RunnableConfig,
+    runtime: Runtime[SillySearchContext],
 ) -> Command[typing.Literal["__end__"]]:
-    llm = init_chat_model(model=cfg.xai_model_name, api_key=cfg.xai_api_key).with_retry(
-        stop_after_attempt=cfg.max_llm_retries
-    )
+    context = get_context(runtime, config)
+    researcher_id = state.get("researcher_id", "")
+    # Folds still running; after a resume in a new process they are gone, and
+    # their outputs are read raw instead.
+    pending = context.pending_folds.get(researcher_id, [])
+    if pending:
+        await asyncio.wait(pending)
+    folded = collect_folds(context, researcher_id)
+    raw_notes = [*state.get("raw_notes", []), *folded["raw_notes"]]
 
-    system_prompt = prompts.research_compressor_system_prompt
+    llm = get_model("compressor")
+
+    system_prompt = prompts.research_compressor_system_prompt.format(
+        date=utils.get_readable_date(),
+        citation_rules=(
+            prompts.source_id_citation_rules
+            if cfg.source_ids_enabled
+            else prompts.numbered_citation_rules
+        ),
+    )
     human_prompt = prompts.research_compressor_human_prompt
 
-    messages = [
-        SystemMessage(content=system_prompt),
-        *state.get("researcher_messages"),
-        HumanMessage(content=human_prompt),
-    ]
+    if raw_notes:
+        folded_tool_call_ids = {
+            *state.get("folded_tool_call_ids", []),
+            *folded["folded_tool_call_ids"],
+        }
+        unfolded_tool_outputs = [
+            message
+            for message in state.get("researcher_messages")
+            if isinstance(message, ToolMessage)
+            and message.tool_call_id not in folded_tool_call_ids
+        ]
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(
+                content=prompts.research_notes_merge_prompt.format(
+                    research_topic=state.get("research_topic"),
+                    notes="\n\n".join(raw_notes),
+                    tool_outputs="\n\n".join(
+                        str(message.text) for message in unfolded_tool_outputs
+                    ),
+                )
+            ),
+            HumanMessage(content=human_prompt),
+        ]
+    else:
+        messages = [
+            SystemMessage(content=system_prompt),
+            *state.get("researcher_messages"),
+            HumanMessage(content=human_prompt),
+        ]
 
     response = await llm.ainvoke(messages)
 
     return Command(
-        goto="__end__", update={"compressed_research": str(response.content)}
+        goto="__end__",
+        update={**folded, "compressed_research": str(response.content)},
     )
@@ -8,6 +8,12 @@ from langgraph.graph import add_messages
 class ResearcherState(TypedDict):
     researcher_messages: Annotated[list[MessageLikeRepresentation], add_messages]
     research_topic: str
+    researcher_id: str
     researcher_iterations: int
     raw_notes: Annotated[list[str], operator.add]
+    folded_tool_call_ids: Annotated[list[str], operator.add]
+    folded_notes: Annotated[dict[str, str], operator.or_]
+    seen_signatures: Annotated[list[list[int]], operator.add]
+    novelty_scores: Annotated[list[float], operator.add]
+    sources: Annotated[dict[str, dict], operator.or_]
     compressed_research: str
@@ -1,24 +1,57 @@
 import asyncio
+import functools
+import hashlib
 import logging
 import typing
 import json
 from typing import Annotated, Literal
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import InjectedToolArg, tool
 from litellm import BaseModel
-from config import cfg
-from tavily_client import TavilyClient
+from batching import MicroBatcher
+from cache import SingleFlight, TieredCache
+from concurrency import ConcurrencyLimiter
+from config import cfg, run_config
+import metrics
+from content_reduction import reduce_content, split_chunks
+from model_registry import get_model
+from similarity import MinHash, NearDuplicateIndex, novelty, sketch
+from search_backend import SearchBackend, default_backend
+from source_registry import RESULT_HEADER_PATTERN, SourceRegistry
+from tool_journal import ToolJournal
 import prompts
 import utils
 
+summary_single_flight = SingleFlight()
+summarization_limiter = ConcurrencyLimiter("summarize", cfg.max_concurrent_summaries)
+minhash = MinHash(permutations=cfg.novelty_minhash_permutations)
+
+
+class SummarizationFailed(Exception):
+    """
+    Raised when a page could not be summarized, so that neither the source registry
+    nor the journal keep the failure; `content` is what to show in its place.
+    """
+
+    def __init__(self, content: str) -> None:
+        super().__init__("summarization failed")
+        self.content = content
+
 
 class SummaryOutputSchema(BaseModel):
     summary: str
     key_excerpts: str
 
 
+class PageSummaryOutputSchema(SummaryOutputSchema):
+    id: str
+
+
+class BatchSummaryOutputSchema(BaseModel):
+    summaries: list[PageSummaryOutputSchema]
+
+
 @tool
 async def search(
     queries: list[str],
@@ -26,80 +59,504 @@ async def search(
     topic: Annotated[
         Literal["general", "news", "finance"], InjectedToolArg
     ] = "general",
+    source_registry: Annotated[SourceRegistry | None, InjectedToolArg] = None,
+    search_client: Annotated[SearchBackend | None, InjectedToolArg] = None,
+    journal: Annotated[ToolJournal | None, InjectedToolArg] = None,
+    journal_key: Annotated[str | None, InjectedToolArg] = None,
 ) -> str:
     """
-    Fetch and summarize search results from Tavily search API.
+    Fetch and summarize search results.
 
     :param queries: List of search queries to execute
     :type queries: list[str]
     :return: Formatted string containing summarized search results
     :rtype: str
     """
-    # TODO: Proper DI via Context
-    # https://docs.langchain.com/oss/python/langchain/runtime
-    tavily_client = TavilyClient(api_key=cfg.tavily_api_key)
+    search_client = search_client or default_backend()
 
-    results = await tavily_client.search(
-        queries=queries, max_results=max_results, topic=topic
+    results, summaries = await stream_summaries(
+        search_client.search_stream(
+            queries=queries, max_results=max_results, topic=topic
+        ),
+        source_registry=source_registry,
+        journal=journal,
+        journal_key=journal_key,
     )
 
-    summarization_tasks = [
-        (
-            utils.async_noop()
-            if not result.get("raw_content")
-            else summarize(content=result.get("raw_content"))
-        )
-        for result in results.values()
-    ]
-
-    summaries = await asyncio.gather(*summarization_tasks)
     summarized_results = {
         url: {
             "title": result["title"],
-            "content": result["content"] if not summary else summary,
+            "content": summaries.get(url) or result["content"],
+            **(
+                {"alternate_urls": result["alternate_urls"]}
+                if result.get("alternate_urls")
+                else {}
+            ),
         }
-        for url, result, summary in zip(results.keys(), results.values(), summaries)
+        for url, result in results.items()
     }
 
     if not summarized_results:
         return "No valid search results found. Please try different search queries or use a different search API."
 
-    return json.dumps(summarized_results, separators=(",", ":"))
+    if source_registry is None or not cfg.source_ids_enabled:
+        return json.dumps(summarized_results, separators=(",", ":"))
+
+    return format_search_results(
+        [
+            (
+                source_registry.register(
+                    url, result["title"], alternate_urls=result.get("alternate_urls")
+                ),
+                result["title"],
+                result["content"],
+            )
+            for url, result in summarized_results.items()
+        ]
+    )
+
+
+def format_search_results(results: list[tuple[str, str, str]]) -> str:
+    """
+    Plain text instead of JSON, which escapes every quote and newline: one
+    "[source ID] title" header line per result, followed by its content. URLs are
+    left to the sources table of the final report.
+    """
+    return "\n\n".join(
+        f"[{source_id}] {' '.join(title.split())}\n{content.strip()}"
+        for source_id, title, content in results
+    )
+
+
+def search_result_contents(output: str) -> list[str]:
+    """
+    The result contents of a search tool output in either format; none for error
+    and "no results" messages.
+    """
+    try:
+        results = json.loads(output)
+    except json.JSONDecodeError:
+        results = None
+    if isinstance(results, dict):
+        return [result["content"] for result in results.values()]
+
+    blocks = RESULT_HEADER_PATTERN.split(output)
+    return [block.strip() for block in blocks[1:] if block.strip()]
+
+
+def measure_novelty(
+    search_outputs: list[str], seen_signatures: list[list[int]]
+) -> tuple[float | None, list[list[int]]]:
+    """
+    Scores how much new information a round of searches brought in: every result is
+    compared with the results seen before it in this researcher.
+
+    :return: the mean novelty of the round's results (None if it had none) and their
+        MinHash signatures
+    """
+    signatures = list[list[int]]()
+    scores = list[float]()
+    for output in search_outputs:
+        for content in search_result_contents(output):
+            signature = minhash.signature(content)
+            if signature:
+                scores.append(novelty(signature, [*seen_signatures, *signatures]))
+                signatures.append(signature)
+
+    if not scores:
+        return None, []
+
+    return sum(scores) / len(scores), signatures
+
+
+async def stream_summaries(
+    results_stream: typing.AsyncIterator[dict],
+    source_registry: SourceRegistry | None,
+    journal: ToolJournal | None = None,
+    journal_key: str | None = None,
+) -> tuple[dict[str, dict], dict[str, str]]:
+    """
+    Starts summarizing every result the moment its query returns.
+
+    Pages whose raw content nearly duplicates an earlier result (syndicated
+    articles, mirrors) are not summarized again: their URL is attached to that
+    result's `alternate_urls` instead.
 
+    Stops early once `search_min_summaries` summaries are ready or the
+    `search_latency_budget_sec` budget runs out; results whose summary is not ready
+    by then keep their Tavily snippet.
 
-async def summarize(content: str) -> str:
-    llm = (
-        init_chat_model(model=cfg.xai_model_name, api_key=cfg.xai_api_key)
-        .with_structured_output(SummaryOutputSchema)
-        .with_retry(stop_after_attempt=cfg.max_llm_retries)
+    :return: results by url and the summaries that made it in time
+    """
+    results = dict[str, dict]()
+    summary_tasks = dict[str, asyncio.Task[str]]()
+    has_new_results = asyncio.Event()
+    near_duplicates = (
+        NearDuplicateIndex(threshold=cfg.near_duplicate_threshold)
+        if cfg.near_duplicate_detection_enabled
+        else None
     )
 
-    content = content[: cfg.max_crawl_content_length]
+    async def consume() -> None:
+        async for result in results_stream:
+            if near_duplicates is not None and result.get("raw_content"):
+                content_sketch = await asyncio.to_thread(sketch, result["raw_content"])
+                original = near_duplicates.add(result["url"], content_sketch)
+                if original is not None:
+                    logging.debug(f"{result['url']} nearly duplicates {original}")
+                    metrics.record_near_duplicate()
+                    results[original].setdefault("alternate_urls", []).append(
+                        result["url"]
+                    )
+                    continue
+
+            results[result["url"]] = result
+            if result.get("raw_content"):
+                summary_tasks[result["url"]] = asyncio.create_task(
+                    summarize_source(
+                        url=result.get("canonical_url", result["url"]),
+                        content=result["raw_content"],
+                        query=result.get("query", ""),
+                        source_registry=source_registry,
+                        journal=journal,
+                        journal_key=journal_key,
+                    )
+                )
+                has_new_results.set()
+
+    consume_task = asyncio.create_task(consume())
+    deadline = (
+        asyncio.get_running_loop().time() + cfg.search_latency_budget_sec
+        if cfg.search_latency_budget_sec
+        else None
+    )
+
+    try:
+        while True:
+            if consume_task.done() and consume_task.exception() is not None:
+                break
+
+            pending = [task for task in summary_tasks.values() if not task.done()]
+            if not consume_task.done():
+                pending.append(consume_task)
+            if not pending:
+                break
+
+            ready = sum(task.done() for task in summary_tasks.values())
+            if cfg.search_min_summaries and ready >= cfg.search_min_summaries:
+                break
+
+            timeout = deadline - asyncio.get_running_loop().time() if deadline else None
+            if timeout is not None and timeout <= 0:
+                logging.info(
+                    f"Search latency budget of {cfg.search_latency_budget_sec}s exceeded, "
+                    f"returning {ready} of {len(summary_tasks)} summaries"
+                )
+                break
+
+            has_new_results.clear()
+            new_results_task = asyncio.create_task(has_new_results.wait())
+            await asyncio.wait(
+                [*pending, new_results_task],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            new_results_task.cancel()
+
+        if consume_task.done():
+            consume_task.result()
+    finally:
+        consume_task.cancel()
+        for task in summary_tasks.values():
+            task.cancel()
+
+    summaries = {
+        url: task.result()
+        for url, task in summary_tasks.items()
+        if task.done() and not task.cancelled() and task.exception() is None
+    }
+
+    return results, summaries
+
+
+async def summarize_source(
+    url: str,
+    content: str,
+    query: str,
+    source_registry: SourceRegistry | None,
+    journal: ToolJournal | None = None,
+    journal_key: str | None = None,
+) -> str:
+    def summarize_once() -> typing.Awaitable[str]:
+        if journal is None or journal_key is None:
+            return summarize(content=content, query=query)
+
+        return journal.run(
+            f"{journal_key}:summary:{url}",
+            lambda: summarize(content=content, query=query),
+        )
+
+    try:
+        if source_registry is None:
+            return await summarize_once()
+
+        return await source_registry.summarize(url, summarize_once)
+    except SummarizationFailed as e:
+        return e.content
+
+
+@metrics.instrument("summarize")
+async def summarize(content: str, query: str = "") -> str:
+    """
+    :raises SummarizationFailed: with the reduced page content
+    """
+    token_budget = (
+        cfg.summarization_chunk_tokens * cfg.max_summarization_chunks
+        if cfg.chunked_summarization_enabled
+        else cfg.summarization_input_token_budget
+    )
+
+    if cfg.content_reduction_enabled:
+        # Tens of milliseconds on long pages, too long to block the event loop.
+        content = await asyncio.to_thread(
+            reduce_content, content, query=query, token_budget=token_budget
+        )
+    elif cfg.chunked_summarization_enabled:
+        content = content[: token_budget * 4]
+    else:
+        content = content[: cfg.max_crawl_content_length]
+
+    key = summary_cache_key(content)
+    summary = await summary_single_flight.run(
+        key, lambda: summarize_with_cache(content=content, key=key)
+    )
+
+    if not summary:
+        raise SummarizationFailed(content)
+
+    return format_summary(summary)
+
+
+async def summarize_with_cache(content: str, key: str) -> SummaryOutputSchema | None:
+    cache = summary_cache()
+    if cache is not None:
+        cached = await cache.get(key)
+        if cached is not None:
+            return SummaryOutputSchema(**cached)
+
+    if (
+        cfg.chunked_summarization_enabled
+        and utils.estimate_tokens(content) > cfg.summarization_chunk_tokens
+    ):
+        summary, is_complete = await summarize_chunked(content)
+    elif (
+        cfg.summary_batching_enabled
+        and utils.estimate_tokens(content) <= cfg.summary_batch_max_page_tokens
+    ):
+        summary = await summary_batcher.submit(content)
+        is_complete = summary is not None
+    else:
+        summary = await summarize_with_llm(content)
+        is_complete = summary is not None
+
+    # Partial summaries are served but not cached, the next run may do better.
+    if summary and is_complete and cache is not None:
+        await cache.set(key, summary.model_dump())
+
+    return summary
+
+
+async def summarize_chunked(content: str) -> tuple[SummaryOutputSchema | None, bool]:
+    """
+    Map-reduce summarization: chunks are summarized concurrently, then merged into
+    one summary. Chunks that fail or time out are left out of the merge.
+
+    :return: the merged summary and whether every chunk made it into it
+    """
+    chunks = split_chunks(content, token_budget=cfg.summarization_chunk_tokens)
+    partials = await asyncio.gather(*[summarize_with_llm(chunk) for chunk in chunks])
+    partials = [partial for partial in partials if partial is not None]
+
+    is_complete = len(partials) == len(chunks)
+    if not is_complete:
+        logging.warning(
+            f"{len(chunks) - len(partials)} of {len(chunks)} chunks failed to summarize, merging the rest"
+        )
+
+    if len(partials) <= 1:
+        return (partials[0] if partials else None), is_complete
+
+    merged = await merge_summaries(partials)
+    if merged is None:
+        return concat_summaries(partials), False
+
+    return merged, is_complete
+
+
+async def merge_summaries(
+    partials: list[SummaryOutputSchema],
+) -> SummaryOutputSchema | None:
+    llm = get_model("summarizer", schema=SummaryOutputSchema)
+
+    partial_summaries = "\n\n".join(
+        f"<partial_summary>\n{format_summary(partial)}\n</partial_summary>"
+        for partial in partials
+    )
+
+    try:
+        prompt = prompts.summary_reduce_prompt.format(
+            partial_summaries=partial_summaries, date=utils.get_readable_date()
+        )
+        async with summarization_limiter.slot():
+            summary = await asyncio.wait_for(
+                llm.ainvoke([HumanMessage(content=prompt)]),
+                timeout=cfg.summarization_timeout_sec,
+            )
+        return typing.cast(SummaryOutputSchema, summary)
+    except Exception as e:
+        logging.warning(
+            f"Merging {len(partials)} partial summaries failed due to error {repr(e)}, concatenating them"
+        )
+        return None
+
+
+def concat_summaries(partials: list[SummaryOutputSchema]) -> SummaryOutputSchema:
+    return SummaryOutputSchema(
+        summary="\n\n".join(partial.summary for partial in partials),
+        key_excerpts=", ".join(partial.key_excerpts for partial in partials),
+    )
+
+
+async def summarize_with_llm(content: str) -> SummaryOutputSchema | None:
+    llm = get_model("summarizer", schema=SummaryOutputSchema)
 
     try:
         prompt = prompts.summarizer_prompt.format(
             webpage_content=content, date=utils.get_readable_date()
         )
-        summary = await asyncio.wait_for(
-            llm.ainvoke([HumanMessage(content=prompt)]),
-            timeout=cfg.summarization_timeout_sec,
-        )
-        summary = typing.cast(SummaryOutputSchema, summary)
-        return f"""<summary>
-        {summary.summary}
-        </summary>
-
-        <key_excerpts>
-        {summary.key_excerpts}
-        </key_excerpts>
-        """
+        async with summarization_limiter.slot():
+            summary = await asyncio.wait_for(
+                llm.ainvoke([HumanMessage(content=prompt)]),
+                timeout=cfg.summarization_timeout_sec,
+            )
+        return typing.cast(SummaryOutputSchema, summary)
     except asyncio.TimeoutError:
         logging.warning(
             f"summarization failed with a timeout of {cfg.summarization_timeout_sec}, returning original content"
         )
-        return content
+        return None
     except Exception as e:
         logging.warning(
             f"Summarization failed due to error {str(e)}, returning original content"
         )
-        return content
+        return None
+
+
+async def summarize_batch(contents: list[str]) -> list[SummaryOutputSchema | None]:
+    """
+    Summarizes several small pages in one structured call, which saves repeating the
+    instructions for every page. Pages the batch call misses, or all of them if it
+    fails, are summarized one by one.
+    """
+    if len(contents) == 1:
+        return [await summarize_with_llm(contents[0])]
+
+    llm = get_model("summarizer", schema=BatchSummaryOutputSchema)
+
+    webpages = "\n\n".join(
+        f'<webpage id="{i}">\n{content}\n</webpage>'
+        for i, content in enumerate(contents)
+    )
+
+    summaries = dict[str, SummaryOutputSchema]()
+    try:
+        prompt = prompts.batch_summarizer_prompt.format(
+            webpages=webpages, date=utils.get_readable_date()
+        )
+        async with summarization_limiter.slot():
+            result = await asyncio.wait_for(
+                llm.ainvoke([HumanMessage(content=prompt)]),
+                timeout=cfg.summarization_timeout_sec,
+            )
+        for page in typing.cast(BatchSummaryOutputSchema, result).summaries:
+            summaries[page.id.strip()] = SummaryOutputSchema(
+                summary=page.summary, key_excerpts=page.key_excerpts
+            )
+    except Exception as e:
+        logging.warning(
+            f"Batch summarization of {len(contents)} pages failed due to error {repr(e)}, summarizing them one by one"
+        )
+
+    missing = [i for i in range(len(contents)) if str(i) not in summaries]
+    retried = await asyncio.gather(*[summarize_with_llm(contents[i]) for i in missing])
+
+    results: list[SummaryOutputSchema | None] = [
+        summaries.get(str(i)) for i in range(len(contents))
+    ]
+    for i, summary in zip(missing, retried):
+        results[i] = summary
+
+    return results
+
+
+summary_batcher = MicroBatcher(
+    summarize_batch,
+    cost=utils.estimate_tokens,
+    max_batch_cost=cfg.summary_batch_max_tokens,
+    max_batch_size=cfg.summary_batch_max_pages,
+    max_wait_sec=cfg.summary_batch_wait_ms / 1000,
+)
+
+
+def format_summary(summary: SummaryOutputSchema) -> str:
+    return f"{summary.summary.strip()}\nKey excerpts: {summary.key_excerpts.strip()}"
+
+
+@functools.cache
+def summary_cache() -> TieredCache | None:
+    if not cfg.summary_cache_enabled:
+        return None
+
+    return TieredCache(
+        name="summary",
+        max_memory_entries=cfg.summary_cache_max_memory_entries,
+        path=cfg.cache_path(cfg.summary_cache_path),
+        max_disk_bytes=cfg.summary_cache_max_disk_bytes,
+    )
+
+
+def summary_cache_key(content: str) -> str:
+    """
+    Content-addressed key: the same page summarized with the same prompt and model
+    always maps to the same entry, no matter which query or URL it came from.
+    """
+    model = run_config().model_settings("summarizer").model
+    version = hashlib.sha256(
+        f"{cfg.summary_cache_version}:{model}:{prompts.summarizer_prompt}:"
+        f"{cfg.chunked_summarization_enabled}:{cfg.summarization_chunk_tokens}:{prompts.summary_reduce_prompt}:"
+        f"{cfg.summary_batching_enabled}:{prompts.batch_summarizer_prompt}".encode()
+    ).hexdigest()[:16]
+    digest = hashlib.sha256(content.encode()).hexdigest()
+
+    return f"summary:{version}:{digest}"
+
+
+def cache_stats() -> dict[str, dict]:
+    """
+    Hits, misses, evictions and coalesced calls of the process-wide search and
+    summary caches, logged at the end of every run.
+    """
+    search_cache = None
+    if cfg.search_backend == "tavily":
+        # Only the Tavily backend has a search cache, and it needs the Tavily SDK.
+        import tavily_client
+
+        search_cache = tavily_client.search_cache()
+
+    return {
+        "search": search_cache.stats.model_dump() if search_cache else {},
+        "summary": {
+            **(summary_cache().stats.model_dump() if summary_cache() else {}),
+            "coalesced": summary_single_flight.coalesced,
+        },
+    }
@@ -0,0 +1,76 @@
+import collections
+import time
+import typing
+
+# Highest first: calls on a session's critical path (supervisor, compression),
+# researcher steps, then bulk work such as summarization.
+type Priority = typing.Literal["critical", "research", "bulk"]
+PRIORITIES: tuple[Priority, ...] = typing.get_args(Priority.__value__)
+
+
+class FairQueue[T]:
+    """
+    Waiting line ordered by priority class, round-robin between sessions within a
+    class, first come first served within a session.
+
+    Waiting ages an item: every `aging_sec` spent in the queue counts as one class
+    higher, so bulk work can't starve behind a steady stream of critical calls.
+    """
+
+    def __init__(self, aging_sec: float) -> None:
+        self.__aging_sec = aging_sec
+        self.__queues = {
+            priority: collections.OrderedDict[str, collections.deque[tuple[float, T]]]()
+            for priority in PRIORITIES
+        }
+        self.__size = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def push(self, item: T, priority: Priority, session: str) -> None:
+        sessions = self.__queues[priority]
+        if session not in sessions:
+            sessions[session] = collections.deque()
+        sessions[session].append((time.perf_counter(), item))
+        self.__size += 1
+
+    def pop(self) -> T:
+        now = time.perf_counter()
+        best: tuple[float, Priority, str] | None = None
+        for rank, (priority, sessions) in enumerate(self.__queues.items()):
+            if not sessions:
+                continue
+
+            # The session next in turn within the class.
+            session, items = next(iter(sessions.items()))
+            enqueued_at, _ = items[0]
+            aged_rank = rank - (now - enqueued_at) / self.__aging_sec
+            if best is None or aged_rank < best[0]:
+                best = (aged_rank, priority, session)
+
+        if best is None:
+            raise IndexError("pop from an empty FairQueue")
+
+        _, priority, session = best
+        sessions = self.__queues[priority]
+        items = sessions.pop(session)
+        _, item = items.popleft()
+        if items:
+            sessions[session] = items
+        self.__size -= 1
+
+        return item
+
+    def remove(self, item: T) -> None:
+        for sessions in self.__queues.values():
+            for session, items in sessions.items():
+                for entry in items:
+                    if entry[1] is item:
+                        items.remove(entry)
+                        if not items:
+                            del sessions[session]
+                        self.__size -= 1
+                        return
+
+        raise ValueError("item is not queued")
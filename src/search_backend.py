@@ -0,0 +1,90 @@
+import abc
+import asyncio
+import functools
+from collections.abc import AsyncIterator
+from typing import Literal
+
+from config import cfg
+from urls import canonicalize_url
+
+type Topic = Literal["general", "news", "finance"]
+
+
+class SearchBackend(abc.ABC):
+    """
+    What the `search` tool runs queries against. Implementations provide
+    `search_one`, which answers a single query in the shape of a Tavily response:
+    {"query": query, "results": [{"url", "title", "content", "raw_content"}, ...]}.
+    """
+
+    @abc.abstractmethod
+    async def search_one(self, query: str, max_results: int, topic: Topic) -> dict:
+        pass
+
+    async def search(
+        self, queries: list[str], max_results: int = 5, topic: Topic = "general"
+    ) -> dict:
+        """
+        :return: dict[url] = {*result}
+        :rtype: dict
+        """
+
+        unique_results = {}
+        async for result in self.search_stream(
+            queries=queries, max_results=max_results, topic=topic
+        ):
+            unique_results[result["url"]] = result
+
+        return unique_results
+
+    async def search_stream(
+        self, queries: list[str], max_results: int = 5, topic: Topic = "general"
+    ) -> AsyncIterator[dict]:
+        """
+        Yields unique results as soon as the query that found them returns, so
+        callers can start working on the first results while slower queries are
+        still running.
+
+        Results are deduplicated by canonical URL (see `canonicalize_url`).
+
+        :return: {*result, "query": query, "canonical_url": canonical_url}
+        :rtype: AsyncIterator[dict]
+        """
+
+        search_tasks = [
+            asyncio.ensure_future(
+                self.search_one(query=query, max_results=max_results, topic=topic)
+            )
+            for query in queries
+        ]
+
+        seen_urls = set[str]()
+        try:
+            for next_response in asyncio.as_completed(search_tasks):
+                response = await next_response
+                for result in response["results"]:
+                    canonical_url = canonicalize_url(result["url"])
+                    if canonical_url not in seen_urls:
+                        seen_urls.add(canonical_url)
+                        yield {
+                            **result,
+                            "query": response["query"],
+                            "canonical_url": canonical_url,
+                        }
+        finally:
+            for task in search_tasks:
+                task.cancel()
+
+
+@functools.cache
+def default_backend() -> SearchBackend:
+    """
+    The process-wide backend selected by `search_backend`.
+    """
+    # Imported here as both implementations build on this module.
+    if cfg.search_backend == "local":
+        from local_search.client import default_client
+    else:
+        from tavily_client import default_client
+
+    return default_client()
@@ -0,0 +1,105 @@
+import hashlib
+import heapq
+import random
+from collections.abc import Sequence
+
+from bm25 import tokenize
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = 4) -> set[str]:
+    """
+    Overlapping runs of `size` words; texts shorter than that are one shingle.
+    """
+    tokens = tokenize(text)
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+
+    return {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+
+class MinHash:
+    """
+    MinHash signatures over word shingles. The share of equal positions in two
+    signatures estimates the Jaccard similarity of the shingle sets.
+    """
+
+    def __init__(self, permutations: int = 64, seed: int = 1) -> None:
+        rng = random.Random(seed)
+        self.__permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(permutations)
+        ]
+
+    def signature(self, text: str) -> list[int]:
+        hashes = [hash64(shingle) for shingle in shingles(text)]
+        if not hashes:
+            return []
+
+        return [
+            min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes)
+            for a, b in self.__permutations
+        ]
+
+
+def jaccard(a: Sequence[int], b: Sequence[int]) -> float:
+    if not a or not b or len(a) != len(b):
+        return 0.0
+
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def novelty(signature: Sequence[int], seen: Sequence[Sequence[int]]) -> float:
+    """
+    1 for a text unlike anything seen, 0 for a near copy of something seen.
+    """
+    return 1.0 - max((jaccard(signature, other) for other in seen), default=0.0)
+
+
+def sketch(text: str, size: int = 128) -> frozenset[int]:
+    """
+    Bottom-k MinHash sketch: the `size` smallest shingle hashes. One hash per shingle
+    instead of one per shingle and permutation, which keeps whole pages cheap.
+    """
+    return frozenset(heapq.nsmallest(size, {hash64(s) for s in shingles(text)}))
+
+
+def sketch_similarity(a: frozenset[int], b: frozenset[int]) -> float:
+    """
+    Estimated Jaccard similarity of the texts behind two sketches of the same size.
+    """
+    if not a or not b:
+        return 0.0
+
+    size = max(len(a), len(b))
+    union = heapq.nsmallest(size, a | b)
+
+    return sum(1 for h in union if h in a and h in b) / len(union)
+
+
+class NearDuplicateIndex:
+    """
+    Groups texts whose estimated similarity reaches `threshold`; the first text of
+    a group represents it.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        self.__threshold = threshold
+        self.__sketches = dict[str, frozenset[int]]()
+
+    def add(self, key: str, text_sketch: frozenset[int]) -> str | None:
+        """
+        :return: the key of the group `key` joined, None if it starts a new one
+        """
+        for other, other_sketch in self.__sketches.items():
+            if sketch_similarity(text_sketch, other_sketch) >= self.__threshold:
+                return other
+
+        self.__sketches[key] = text_sketch
+        return None
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import re
+from collections.abc import Awaitable, Callable, Iterable
+
+from urls import canonicalize_url
+
+# Crockford's base32: no I, L, O or U to misread.
+ID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ID_PATTERN = re.compile(r"\bS[0-9A-Z]{5}(?:[0-9A-Z]{3})?\b")
+# The "[ID] title" line opening every result of a search tool output.
+RESULT_HEADER_PATTERN = re.compile(r"^\[S[0-9A-Z]{5,8}\] .*$", re.MULTILINE)
+
+
+class SourceRegistry:
+    """
+    Per-run registry of sources, shared by every researcher of a run.
+
+    The first researcher to reach a URL summarizes it, everyone else gets the same
+    summary: either straight from the registry or, if the summary is still being
+    produced, by awaiting the in-flight call. A summary that fails is forgotten, the
+    next researcher to reach the URL tries again.
+
+    Sources also get short IDs, such as S3F9KQ, that tool outputs and notes cite
+    instead of repeating URLs; `sources_table` turns the cited IDs back into URLs
+    for the final report. IDs are derived from the canonical URL, so they are the
+    same in every researcher and across resumed runs. Only the ID -> URL table has
+    to be carried along, see `restore`.
+    """
+
+    def __init__(self) -> None:
+        self.duplicates_saved = 0
+        self.__summaries = dict[str, asyncio.Future[str]]()
+        self.__sources = dict[str, dict]()
+
+    async def summarize(self, url: str, cb: Callable[[], Awaitable[str]]) -> str:
+        summary = self.__summaries.get(url)
+        if summary is not None:
+            self.duplicates_saved += 1
+            return await asyncio.shield(summary)
+
+        task = asyncio.ensure_future(cb())
+        self.__summaries[url] = task
+        task.add_done_callback(self.__forget_failed(url))
+
+        return await asyncio.shield(task)
+
+    def register(
+        self, url: str, title: str, alternate_urls: list[str] | None = None
+    ) -> str:
+        """
+        :return: the ID of the source at `url`
+        """
+        canonical_url = canonicalize_url(url)
+        source_id = make_source_id(canonical_url)
+        known = self.__sources.get(source_id)
+        if known is not None and canonicalize_url(known["url"]) != canonical_url:
+            # Two URLs sharing a short ID, the later one gets a longer ID.
+            source_id = make_source_id(canonical_url, size=8)
+            known = self.__sources.get(source_id)
+
+        if known is None:
+            self.__sources[source_id] = {"url": url, "title": " ".join(title.split())}
+            known = self.__sources[source_id]
+        for alternate_url in alternate_urls or []:
+            if alternate_url not in known.setdefault("alternate_urls", []):
+                known["alternate_urls"].append(alternate_url)
+
+        return source_id
+
+    def restore(self, sources: dict[str, dict]) -> None:
+        """
+        Adds sources registered in an earlier process, e.g. before a resume.
+        """
+        for source_id, source in sources.items():
+            self.__sources.setdefault(source_id, source)
+
+    def lookup(self, source_ids: Iterable[str]) -> dict[str, dict]:
+        return {
+            source_id: self.__sources[source_id]
+            for source_id in source_ids
+            if source_id in self.__sources
+        }
+
+    def sources_table(self, source_ids: Iterable[str]) -> str:
+        """
+        One "[ID] title: URL" line per known source, alternate URLs appended.
+        """
+        lines = []
+        for source_id, source in self.lookup(source_ids).items():
+            line = f"[{source_id}] {source['title']}: {source['url']}"
+            if source.get("alternate_urls"):
+                line += f" (also {', '.join(source['alternate_urls'])})"
+            lines.append(line)
+
+        return "\n".join(lines)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "sources": len(self.__summaries),
+            "duplicates_saved": self.duplicates_saved,
+        }
+
+    def __forget_failed(self, url: str) -> Callable[[asyncio.Future[str]], None]:
+        def forget(task: asyncio.Future[str]) -> None:
+            if task.cancelled() or task.exception() is not None:
+                self.__summaries.pop(url, None)
+
+        return forget
+
+
+def make_source_id(canonical_url: str, size: int = 5) -> str:
+    value = int.from_bytes(
+        hashlib.blake2b(canonical_url.encode(), digest_size=8).digest()
+    )
+    chars = []
+    for _ in range(size):
+        value, index = divmod(value, len(ID_ALPHABET))
+        chars.append(ID_ALPHABET[index])
+
+    return "S" + "".join(chars)
+
+
+def cited_ids(text: str) -> list[str]:
+    """
+    Every source ID `text` mentions, in order of first mention.
+    """
+    return list(dict.fromkeys(ID_PATTERN.findall(text)))
+
+
+def pack_output(output: str, registry: SourceRegistry) -> str:
+    """
+    Bundles a tool output with the sources it cites, so a journal replay in a
+    later process can restore them with `unpack_output`.
+    """
+    return json.dumps({"output": output, "sources": registry.lookup(cited_ids(output))})
+
+
+def unpack_output(record: str, registry: SourceRegistry) -> str:
+    try:
+        packed = json.loads(record)
+    except json.JSONDecodeError:
+        return record
+
+    if not isinstance(packed, dict) or packed.keys() != {"output", "sources"}:
+        # Recorded before outputs were packed.
+        return record
+
+    registry.restore(packed["sources"])
+    return packed["output"]
@@ -1,10 +1,13 @@
 import asyncio
-from langchain.chat_models import init_chat_model
+import logging
+import time
 from langchain_core.messages import (
     AIMessage,
     HumanMessage,
+    MessageLikeRepresentation,
     SystemMessage,
     ToolMessage,
+    ToolCall,
     filter_messages,
     get_buffer_string,
 )
@@ -14,13 +17,21 @@ from langgraph.types import Command
 from pydantic import BaseModel, Field
 from langgraph.runtime import Runtime
 
+from concurrency import ConcurrencyLimiter
 from config import cfg
+from context import SillySearchContext, get_context, release_context
+from model_registry import get_model
 import supervisor.supervisor_state as supervisor_state
 import prompts
+import researcher.researcher_tools as researcher_tools
 import utils
 import typing
 import common_tools
+import context_compaction
+import metrics
+import source_registry
 import supervisor.supervisor_tools as supervisor_tools
+import tool_journal
 
 
 class ClarifyUserRequestOutputSchema(BaseModel):
@@ -37,34 +48,111 @@ class ClarifyUserRequestOutputSchema(BaseModel):
 
 async def clarify_user_request(
     state: supervisor_state.SillySearchState,
-) -> Command[typing.Literal["write_research_brief", "__end__"]]:
-    llm = init_chat_model(model=cfg.xai_model_name, api_key=cfg.xai_api_key)
-    model = llm.with_structured_output(ClarifyUserRequestOutputSchema).with_retry(
-        stop_after_attempt=cfg.max_llm_retries
+) -> Command[
+    typing.Literal[
+        "write_research_brief", "supervise", "handle_supervisor_tools", "__end__"
+    ]
+]:
+    """
+    With `speculative_research_brief_enabled`, the research brief (and with
+    `speculative_supervise_enabled` the first supervisor turn) is produced while
+    clarification is still running, on the bet that no clarification is needed.
+    If it is, the speculative work is cancelled and thrown away; if the speculative
+    work fails, the brief is written the normal way.
+    """
+    if not cfg.speculative_research_brief_enabled:
+        result = await check_clarification(state["messages"])
+        if result.need_clarification:
+            return Command(
+                update={"messages": [AIMessage(content=result.question)]},
+                goto="__end__",
+            )
+
+        return Command(
+            update={"messages": [AIMessage(content=result.verification)]},
+            goto="write_research_brief",
+        )
+
+    speculation = asyncio.create_task(speculate_research(state["messages"]))
+    try:
+        result = await check_clarification(state["messages"])
+    except BaseException:
+        speculation.cancel()
+        raise
+
+    if result.need_clarification:
+        speculation.cancel()
+        metrics.record_speculation("discarded")
+        return Command(
+            update={"messages": [AIMessage(content=result.question)]}, goto="__end__"
+        )
+
+    try:
+        research_brief, supervisor_messages = await speculation
+    except Exception as e:
+        logging.warning(f"Speculative research failed due to error {str(e)}")
+        metrics.record_speculation("failed")
+        return Command(
+            update={"messages": [AIMessage(content=result.verification)]},
+            goto="write_research_brief",
+        )
+
+    metrics.record_speculation("used")
+    update = {
+        "messages": [
+            AIMessage(content=result.verification),
+            AIMessage(content=research_brief),
+        ],
+        "research_brief": research_brief,
+    }
+
+    if not supervisor_messages:
+        return Command(update=update, goto="supervise")
+
+    return Command(
+        update={
+            **update,
+            "supervisor_messages": supervisor_messages,
+            "supervisor_iterations": 1,
+        },
+        goto="handle_supervisor_tools",
+    )
+
+
+async def speculate_research(
+    messages: list[MessageLikeRepresentation],
+) -> tuple[str, list[MessageLikeRepresentation]]:
+    """
+    :return: the research brief and, if `speculative_supervise_enabled`, the
+        supervisor messages after its first turn
+    """
+    research_brief = await draft_research_brief(messages)
+    if not cfg.speculative_supervise_enabled:
+        return research_brief, []
+
+    return research_brief, await ask_supervisor(
+        initial_supervisor_messages(research_brief)
     )
 
+
+@metrics.instrument("clarify_user_request")
+async def check_clarification(
+    messages: list[MessageLikeRepresentation],
+) -> ClarifyUserRequestOutputSchema:
+    model = get_model("clarifier", schema=ClarifyUserRequestOutputSchema)
+
     result = await model.ainvoke(
         [
             HumanMessage(
                 content=prompts.clarify_prompt.format(
-                    messages=get_buffer_string(state["messages"]),
+                    messages=get_buffer_string(messages),
                     date=utils.get_readable_date(),
                 ),
             )
         ],
     )
 
-    result = typing.cast(ClarifyUserRequestOutputSchema, result)
-
-    if result.need_clarification:
-        return Command(
-            update={"messages": [AIMessage(content=result.question)]}, goto="__end__"
-        )
-
-    return Command(
-        update={"messages": [AIMessage(content=result.verification)]},
-        goto="write_research_brief",
-    )
+    return typing.cast(ClarifyUserRequestOutputSchema, result)
 
 
 class ResearchBriefOutputSchema(BaseModel):
@@ -76,79 +164,93 @@ class ResearchBriefOutputSchema(BaseModel):
 async def write_research_brief(
     state: supervisor_state.SillySearchState, config: RunnableConfig
 ) -> Command[typing.Literal["supervise"]]:
-    llm = init_chat_model(model=cfg.xai_model_name, api_key=cfg.xai_api_key)
-    model = llm.with_structured_output(ResearchBriefOutputSchema).with_retry(
-        stop_after_attempt=cfg.max_llm_retries
+    research_brief = await draft_research_brief(state["messages"])
+
+    return Command(
+        update={
+            "messages": [AIMessage(content=research_brief)],
+            "research_brief": research_brief,
+        },
+        goto="supervise",
     )
 
+
+@metrics.instrument("write_research_brief")
+async def draft_research_brief(messages: list[MessageLikeRepresentation]) -> str:
+    model = get_model("brief_writer", schema=ResearchBriefOutputSchema)
+
     result = await model.ainvoke(
         [
             HumanMessage(
                 content=prompts.create_research_brief_prompt.format(
-                    messages=get_buffer_string(state["messages"]),
+                    messages=get_buffer_string(messages),
                     date=utils.get_readable_date(),
                 )
             )
         ]
     )
 
-    result = typing.cast(ResearchBriefOutputSchema, result)
-
-    return Command(
-        update={
-            "messages": [AIMessage(content=result.research_brief)],
-            "research_brief": result.research_brief,
-        },
-        goto="supervise",
-    )
+    return typing.cast(ResearchBriefOutputSchema, result).research_brief
 
 
 async def supervise(
     state: supervisor_state.SillySearchState, runtime: Runtime
 ) -> Command[typing.Literal["handle_supervisor_tools"]]:
-    available_tools = [
-        common_tools.ResearchCompleteTool,
-        common_tools.think,
-        supervisor_tools.invoke_researcher,
-    ]
+    messages = state.get("supervisor_messages") or initial_supervisor_messages(
+        state.get("research_brief")
+    )
 
-    llm = (
-        init_chat_model(model=cfg.xai_model_name, api_key=cfg.xai_api_key)
-        .bind_tools(available_tools)
-        .with_retry(stop_after_attempt=cfg.max_llm_retries)
+    return Command(
+        goto="handle_supervisor_tools",
+        update={
+            "supervisor_messages": await ask_supervisor(messages),
+            "supervisor_iterations": state.get("supervisor_iterations", 0) + 1,
+        },
     )
 
-    brief = state.get("research_brief")
+
+def initial_supervisor_messages(
+    research_brief: str,
+) -> list[MessageLikeRepresentation]:
     system_prompt = prompts.supervisor_prompt.format(
         date=utils.get_readable_date(),
         max_researcher_iterations=cfg.max_supervisor_iterations,
         max_concurrent_research_units=cfg.max_concurrent_researchers,
     )
 
-    messages = []
-    supervisor_messages = state.get("supervisor_messages")
+    return [SystemMessage(content=system_prompt), HumanMessage(content=research_brief)]
 
-    if supervisor_messages:
-        messages = supervisor_messages
-    else:
-        messages = [SystemMessage(content=system_prompt), HumanMessage(content=brief)]
 
-    response = await llm.ainvoke(messages)
+@metrics.instrument("supervise")
+async def ask_supervisor(
+    messages: list[MessageLikeRepresentation],
+) -> list[MessageLikeRepresentation]:
+    available_tools = [
+        common_tools.ResearchCompleteTool,
+        common_tools.think,
+        supervisor_tools.invoke_researcher,
+    ]
 
-    messages += [response]
+    llm = get_model("supervisor", tools=available_tools)
 
-    return Command(
-        goto="handle_supervisor_tools",
-        update={
-            "supervisor_messages": messages,
-            "supervisor_iterations": state.get("supervisor_iterations", 0) + 1,
-        },
+    response = await llm.ainvoke(
+        context_compaction.compact_for_llm(
+            "supervisor", messages, token_budget=cfg.supervisor_context_token_budget
+        )
     )
 
+    return [*messages, response]
+
 
+@metrics.instrument("handle_supervisor_tools")
 async def handle_supervisor_tools(
-    state: supervisor_state.SillySearchState, researcher: CompiledStateGraph
+    state: supervisor_state.SillySearchState,
+    config: RunnableConfig,
+    runtime: Runtime[SillySearchContext],
+    researcher: CompiledStateGraph,
 ) -> Command[typing.Literal["__end__", "supervise"]]:
+    context = get_context(runtime, config)
+    context.source_registry.restore(state.get("sources", {}))
     latest_message = state.get("supervisor_messages")[-1]
     latest_message = typing.cast(AIMessage, latest_message)
 
@@ -168,6 +270,16 @@ async def handle_supervisor_tools(
                 state.get("supervisor_messages", []), include_types="tool"
             )
         ]
+        sources_table = context.source_registry.sources_table(
+            source_registry.cited_ids("\n\n".join(map(str, notes)))
+        )
+        if sources_table:
+            # The notes cite sources by ID only, the URLs are attached once here.
+            notes.append(f"### Sources\n{sources_table}")
+        logging.info(f"Source registry stats: {context.source_registry.stats()}")
+        logging.info(f"Process cache stats: {researcher_tools.cache_stats()}")
+        metrics.write_run_summary(metrics.current_run_id())
+        release_context(config)
         return Command(goto="__end__", update={"notes": notes})
 
     think_tool_calls = [
@@ -179,7 +291,7 @@ async def handle_supervisor_tools(
     messages = []
 
     for call in think_tool_calls:
-        content = await common_tools.think.ainvoke(call)
+        content = await common_tools.think.ainvoke(call["args"])
         messages.append(ToolMessage(content=content, tool_call_id=call["id"]))
 
     researcher_tool_calls = [
@@ -189,19 +301,35 @@ async def handle_supervisor_tools(
     ]
 
     if researcher_tool_calls:
-        allowed_calls_tool_calls = researcher_tool_calls[
-            : cfg.max_concurrent_researchers
-        ]
-        overflow_tool_calls = researcher_tool_calls[cfg.max_concurrent_researchers :]
-
+        if cfg.queue_overflow_researchers:
+            allowed_calls_tool_calls = researcher_tool_calls
+            overflow_tool_calls = []
+        else:
+            allowed_calls_tool_calls = researcher_tool_calls[
+                : cfg.max_concurrent_researchers
+            ]
+            overflow_tool_calls = researcher_tool_calls[
+                cfg.max_concurrent_researchers :
+            ]
+
+        limiter = ConcurrencyLimiter("researchers", cfg.max_concurrent_researchers)
         researcher_tasks = [
-            supervisor_tools.invoke_researcher.ainvoke(
-                {**call["args"], "researcher": researcher}
+            run_researcher(
+                call=call,
+                researcher=researcher,
+                context=context,
+                limiter=limiter,
+                run_id=utils.get_run_id(config),
             )
-            for call in researcher_tool_calls
+            for call in allowed_calls_tool_calls
         ]
 
+        started_at = time.perf_counter()
         search_hits = await asyncio.gather(*researcher_tasks)
+        logging.info(
+            f"Researchers finished in {time.perf_counter() - started_at:.2f}s, "
+            f"max queue wait {limiter.stats().max_wait_sec:.2f}s"
+        )
 
         for call in overflow_tool_calls:
             messages.append(
@@ -214,6 +342,53 @@ async def handle_supervisor_tools(
         for call, hit in zip(allowed_calls_tool_calls, search_hits):
             messages.append(ToolMessage(content=hit, tool_call_id=call["id"]))
 
-        return Command(goto="supervise", update={"supervisor_messages": messages})
+        return Command(
+            goto="supervise",
+            update={
+                "supervisor_messages": messages,
+                "sources": context.source_registry.lookup(
+                    source_registry.cited_ids("\n\n".join(search_hits))
+                ),
+            },
+        )
 
     return Command(goto="supervise", update={"supervisor_messages": messages})
+
+
+async def run_researcher(
+    call: ToolCall,
+    researcher: CompiledStateGraph,
+    context: SillySearchContext,
+    limiter: ConcurrencyLimiter,
+    run_id: str,
+) -> str:
+    def invoke() -> typing.Awaitable[str]:
+        return supervisor_tools.invoke_researcher.ainvoke(
+            {**call["args"], "researcher": researcher, "context": context}
+        )
+
+    async def packed_invoke() -> str:
+        return source_registry.pack_output(await invoke(), context.source_registry)
+
+    async with limiter.slot() as waited:
+        started_at = time.perf_counter()
+        # A checkpointed researcher resumes from a namespace langgraph assigns by
+        # invocation order within the step, so on replay every researcher has to be
+        # invoked again, in order; finished ones return straight from their last
+        # checkpoint.
+        if context.journal is None or cfg.researcher_checkpointing_enabled:
+            hit = await invoke()
+        else:
+            hit = source_registry.unpack_output(
+                await context.journal.run(
+                    tool_journal.journal_key(run_id, call["id"]), packed_invoke
+                ),
+                context.source_registry,
+            )
+        elapsed = time.perf_counter() - started_at
+
+    logging.info(
+        f"Researcher {call['id']} ran for {elapsed:.2f}s after queueing for {waited:.2f}s"
+    )
+
+    return hit
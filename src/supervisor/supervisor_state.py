@@ -10,6 +10,7 @@ class SillySearchState(MessagesState):
     research_brief: str
     raw_notes: Annotated[list[str], operator.add]
     notes: Annotated[list[str], operator.add]
+    sources: Annotated[dict[str, dict], operator.or_]
     final_report: str
 
 
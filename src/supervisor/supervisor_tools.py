@@ -4,11 +4,14 @@ from langchain_core.tools import InjectedToolArg
 from langgraph.graph.state import CompiledStateGraph
 import typing
 
+from context import SillySearchContext
+
 
 @tool
 async def invoke_researcher(
     research_topic: str,
     researcher: typing.Annotated[CompiledStateGraph, InjectedToolArg],
+    context: typing.Annotated[SillySearchContext, InjectedToolArg],
 ) -> str:
     """
     Call this tool to conduct research on a specific topic.
@@ -17,7 +20,13 @@ async def invoke_researcher(
     :type research_topic: str
     """
 
-    response = await researcher.ainvoke(input={"research_topic": research_topic})
+    response = await researcher.ainvoke(
+        input={"research_topic": research_topic}, context=context
+    )
+
+    # Sources of a researcher that resumed from a checkpoint written by another
+    # process.
+    context.source_registry.restore(response.get("sources", {}))
 
     return response.get(
         "compressed_research", "The researcher failed to complete its job"
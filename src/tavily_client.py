@@ -1,41 +1,132 @@
-import asyncio
-from typing import Literal
+import functools
 import tavily
 
+from cache import SingleFlight, TieredCache
+from call_policy import call_policy
+from concurrency import AdaptiveLimiter, ConcurrencyLimiter, Limiter
+from config import cfg
+import metrics
+from search_backend import SearchBackend, Topic
 
-class TavilyClient:
-    def __init__(self, api_key: str) -> None:
-        self.__client = tavily.AsyncTavilyClient(api_key=api_key)
 
-    async def search(
+class TavilyClient(SearchBackend):
+    def __init__(
         self,
-        queries: list[str],
-        max_results: int = 5,
-        topic: Literal["general", "news", "finance"] = "general",
-    ) -> dict:
+        api_key: str,
+        cache: TieredCache | None = None,
+        cache_ttl_sec: dict[str, int] | None = None,
+        limiter: Limiter | None = None,
+        sdk_client: tavily.AsyncTavilyClient | None = None,
+    ) -> None:
+        self.__client = sdk_client or tavily.AsyncTavilyClient(api_key=api_key)
+        self.__cache = cache
+        self.__cache_ttl_sec = cache_ttl_sec or {}
+        self.__limiter = limiter
+        self.__single_flight = SingleFlight()
+
+    @metrics.instrument("tavily_search")
+    async def search_one(self, query: str, max_results: int, topic: Topic) -> dict:
         """
         https://docs.tavily.com/documentation/api-reference/endpoint/search
-
-        :return: dict[url] = {*tavily_result}
-        :rtype: dict
         """
+        key = cache_key(query=query, max_results=max_results, topic=topic)
+
+        return await self.__single_flight.run(
+            key, lambda: self.__search_cached(key, query, max_results, topic)
+        )
+
+    async def __search_cached(
+        self,
+        key: str,
+        query: str,
+        max_results: int,
+        topic: Topic,
+    ) -> dict:
+        if self.__cache is not None:
+            cached = await self.__cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self.__limiter is None:
+            response = await self.__request(query, max_results, topic)
+        else:
+            async with self.__limiter.slot():
+                response = await self.__request(query, max_results, topic)
+
+        if self.__cache is not None:
+            await self.__cache.set(
+                key, response, ttl_sec=self.__cache_ttl_sec.get(topic)
+            )
+
+        return response
 
-        search_tasks = [
-            self.__client.search(
+    async def __request(
+        self,
+        query: str,
+        max_results: int,
+        topic: Topic,
+    ) -> dict:
+        return await call_policy(f"tavily:{topic}").run(
+            lambda: self.__client.search(
                 query=query,
                 max_results=max_results,
                 topic=topic,
                 include_raw_content=True,
-            )
-            for query in queries
-        ]
+            ),
+            hedge_slot=self.__limiter.slot if self.__limiter is not None else None,
+        )
+
+
+@functools.cache
+def search_cache() -> TieredCache | None:
+    if not cfg.search_cache_enabled:
+        return None
+
+    return TieredCache(
+        name="search",
+        max_memory_entries=cfg.search_cache_max_memory_entries,
+        path=cfg.cache_path(cfg.search_cache_path),
+        max_disk_bytes=cfg.search_cache_max_disk_bytes,
+    )
+
+
+@functools.cache
+def search_limiter() -> Limiter:
+    if not cfg.adaptive_concurrency_enabled:
+        return ConcurrencyLimiter("tavily", cfg.max_concurrent_searches)
+
+    return AdaptiveLimiter(
+        "tavily",
+        initial_limit=cfg.max_concurrent_searches,
+        min_limit=cfg.min_concurrent_searches,
+        max_limit=cfg.max_adaptive_concurrent_searches,
+        backoff_factor=cfg.adaptive_concurrency_backoff_factor,
+        latency_tolerance=cfg.adaptive_concurrency_latency_tolerance,
+        priority_aging_sec=cfg.priority_aging_sec,
+    )
+
+
+@functools.cache
+def default_client() -> TavilyClient:
+    """
+    The process-wide client: one Tavily SDK instance, one response cache and one cap
+    on in-flight requests for every researcher of every session.
+    """
+    return TavilyClient(
+        api_key=cfg.tavily_api_key,
+        cache=search_cache(),
+        cache_ttl_sec={
+            "general": cfg.search_cache_ttl_general_sec,
+            "news": cfg.search_cache_ttl_news_sec,
+            "finance": cfg.search_cache_ttl_finance_sec,
+        },
+        limiter=search_limiter(),
+    )
+
 
-        responses = await asyncio.gather(*search_tasks)
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
 
-        unique_results = {}
-        for response in responses:
-            for result in response["result"]:
-                if result["url"] not in unique_results:
-                    unique_results["url"] = {**result, "query": response["query"]}
 
-        return unique_results
+def cache_key(query: str, max_results: int, topic: str) -> str:
+    return f"tavily:{topic}:{max_results}:{normalize_query(query)}"
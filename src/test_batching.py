@@ -0,0 +1,126 @@
+import asyncio
+
+from batching import MicroBatcher
+import researcher.researcher_tools as researcher_tools
+
+
+def make_batcher(
+    batches: list[list[str]], max_batch_size: int = 3, max_wait_sec: float = 0.01
+) -> MicroBatcher[str, str | None]:
+    async def summarize(items: list[str]) -> list[str | None]:
+        batches.append(items)
+        # A page the batch call can't make sense of comes back empty.
+        return [None if item == "bad" else item.upper() for item in items]
+
+    return MicroBatcher(
+        summarize,
+        cost=len,
+        max_batch_cost=100,
+        max_batch_size=max_batch_size,
+        max_wait_sec=max_wait_sec,
+    )
+
+
+def test_flushes_on_size():
+    batches = list[list[str]]()
+    # Only a full batch can be sent before the test times out.
+    batcher = make_batcher(batches, max_batch_size=3, max_wait_sec=60)
+
+    async def run() -> list[str | None]:
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(item) for item in ("a", "b", "c"))), 1
+        )
+
+    assert asyncio.run(run()) == ["A", "B", "C"]
+    assert batches == [["a", "b", "c"]]
+
+
+def test_flushes_on_timeout():
+    batches = list[list[str]]()
+    batcher = make_batcher(batches, max_batch_size=10)
+
+    async def run() -> list[str | None]:
+        first = asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        await asyncio.sleep(0.05)
+        return [*await first, await batcher.submit("c")]
+
+    assert asyncio.run(run()) == ["A", "B", "C"]
+    assert batches == [["a", "b"], ["c"]]
+
+
+def test_flushes_on_cost():
+    batches = list[list[str]]()
+    batcher = make_batcher(batches, max_batch_size=10)
+
+    async def run() -> list[str | None]:
+        return await asyncio.gather(
+            batcher.submit("x" * 60), batcher.submit("y" * 60), batcher.submit("z")
+        )
+
+    assert asyncio.run(run()) == ["X" * 60, "Y" * 60, "Z"]
+    assert batches == [["x" * 60], ["y" * 60, "z"]]
+
+
+def test_failed_item_does_not_fail_the_batch():
+    batches = list[list[str]]()
+    batcher = make_batcher(batches)
+
+    async def run() -> list[str | None]:
+        return await asyncio.gather(*(batcher.submit(item) for item in ("a", "bad")))
+
+    assert asyncio.run(run()) == ["A", None]
+    assert batches == [["a", "bad"]]
+
+
+def test_failed_batch_fails_its_items():
+    async def fail(items: list[str]) -> list[str]:
+        raise ConnectionError("reset")
+
+    batcher = MicroBatcher(
+        fail, cost=len, max_batch_cost=100, max_batch_size=2, max_wait_sec=0.01
+    )
+
+    async def run() -> list[BaseException | str]:
+        return await asyncio.gather(
+            batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+        )
+
+    assert all(isinstance(result, ConnectionError) for result in asyncio.run(run()))
+
+
+class FakeSummarizer:
+    """
+    Answers batch calls for every page but the second, and single-page calls.
+    """
+
+    def __init__(self, schema: type) -> None:
+        self.schema = schema
+
+    async def ainvoke(self, messages: list) -> object:
+        if self.schema is researcher_tools.BatchSummaryOutputSchema:
+            return researcher_tools.BatchSummaryOutputSchema(
+                summaries=[
+                    researcher_tools.PageSummaryOutputSchema(
+                        id=str(i), summary=f"batch {i}", key_excerpts=""
+                    )
+                    for i in (0, 2)
+                ]
+            )
+
+        return researcher_tools.SummaryOutputSchema(summary="single", key_excerpts="")
+
+
+def test_pages_missing_from_a_batch_are_summarized_alone(monkeypatch):
+    monkeypatch.setattr(
+        researcher_tools,
+        "get_model",
+        lambda role, schema: FakeSummarizer(schema),
+    )
+
+    summaries = asyncio.run(researcher_tools.summarize_batch(["a", "b", "c"]))
+
+    assert [summary.summary for summary in summaries] == [
+        "batch 0",
+        "single",
+        "batch 2",
+    ]
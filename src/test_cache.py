@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from cache import SingleFlight, TieredCache
+
+
+def test_single_flight_shares_one_call():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fetch() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "page"
+
+    async def run() -> list[str]:
+        return await asyncio.gather(
+            *(single_flight.run("key", fetch) for _ in range(5))
+        )
+
+    assert asyncio.run(run()) == ["page"] * 5
+    assert calls == 1
+    assert single_flight.coalesced == 4
+
+
+def test_single_flight_failure_reaches_every_caller():
+    single_flight = SingleFlight()
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise ConnectionError("reset")
+
+    async def run() -> list[BaseException | str]:
+        return await asyncio.gather(
+            *(single_flight.run("key", fail) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_entries_expire(tmp_path, monkeypatch, on_disk):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = TieredCache(
+        "test",
+        max_memory_entries=10,
+        path=str(tmp_path / "cache.sqlite3") if on_disk else None,
+    )
+
+    async def run() -> list[str | None]:
+        await cache.set("key", "value", ttl_sec=60)
+        fresh = await cache.get("key")
+        now[0] += 61
+        return [fresh, await cache.get("key")]
+
+    assert asyncio.run(run()) == ["value", None]
+    assert cache.stats.expirations == 1
+
+
+def test_evicts_least_recently_used():
+    cache = TieredCache("test", max_memory_entries=2)
+
+    async def run() -> list[str | None]:
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        await cache.get("a")
+        await cache.set("c", "3")
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == ["1", None, "3"]
+    assert cache.stats.evictions == 1
+
+
+def test_disk_tier_outlives_the_memory_tier(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run() -> str | None:
+        await TieredCache("test", max_memory_entries=2, path=path).set("key", [1, 2])
+        return await TieredCache("test", max_memory_entries=2, path=path).get("key")
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_disk_tier_is_bounded_by_size(tmp_path):
+    cache = TieredCache(
+        "test",
+        max_memory_entries=1,
+        path=str(tmp_path / "cache.sqlite3"),
+        max_disk_bytes=25,
+    )
+
+    async def run() -> list[str | None]:
+        for key in ("a", "b", "c"):
+            await cache.set(key, key * 10)
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [None, "b" * 10, "c" * 10]
@@ -0,0 +1,232 @@
+import asyncio
+import operator
+import sqlite3
+import typing
+
+import pytest
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.graph import StateGraph
+
+from checkpointer import SqliteCheckpointer
+
+
+def make_checkpointer(path, keep_last: int = 3) -> SqliteCheckpointer:
+    return SqliteCheckpointer(
+        path=str(path), keep_last=keep_last, compress_min_bytes=64
+    )
+
+
+def put(
+    checkpointer: SqliteCheckpointer,
+    parent: dict | None,
+    values: dict[str, typing.Any],
+    changed: list[str],
+    thread_id: str = "thread",
+    checkpoint_ns: str = "",
+    root_checkpoint_id: str | None = None,
+    step: int = 0,
+) -> tuple[dict, dict]:
+    """
+    Saves a checkpoint holding `values` on top of `parent`, with new versions for the
+    `changed` channels only, the way the pregel loop does.
+
+    :return: the saved checkpoint and the config pointing at it
+    """
+    checkpoint = create_checkpoint(parent, None, step) if parent else empty_checkpoint()
+    versions = dict(checkpoint["channel_versions"])
+    for channel in changed:
+        versions[channel] = checkpointer.get_next_version(versions.get(channel), None)
+    checkpoint = {**checkpoint, "channel_values": values, "channel_versions": versions}
+
+    configurable = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+    if parent:
+        configurable["checkpoint_id"] = parent["id"]
+    if root_checkpoint_id:
+        configurable["checkpoint_map"] = {"": root_checkpoint_id}
+
+    config = checkpointer.put(
+        {"configurable": configurable},
+        checkpoint,
+        {"source": "loop", "step": step},
+        {channel: versions[channel] for channel in changed},
+    )
+
+    return checkpoint, config
+
+
+def count_rows(path, table: str, **where: str) -> int:
+    clauses = " AND ".join(f"{column} = ?" for column in where) or "1"
+    with sqlite3.connect(path) as db:
+        (count,) = db.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE {clauses}", tuple(where.values())
+        ).fetchone()
+
+    return count
+
+
+def test_round_trip(tmp_path):
+    checkpointer = make_checkpointer(tmp_path / "checkpoints.sqlite3")
+    values = {"notes": ["a" * 500, "b"], "topic": "solar"}
+
+    checkpoint, config = put(checkpointer, None, values, changed=["notes", "topic"])
+    checkpointer.put_writes(config, [("notes", ["c" * 500])], task_id="task")
+
+    loaded = checkpointer.get_tuple(config)
+    assert loaded is not None
+    assert loaded.checkpoint["id"] == checkpoint["id"]
+    assert loaded.checkpoint["channel_values"] == values
+    assert loaded.metadata["step"] == 0
+    assert loaded.parent_config is None
+    assert loaded.pending_writes == [("task", "notes", ["c" * 500])]
+
+    # Large values are stored compressed.
+    assert count_rows(tmp_path / "checkpoints.sqlite3", "blobs", channel="notes") == 1
+    with sqlite3.connect(tmp_path / "checkpoints.sqlite3") as db:
+        (compressed,) = db.execute(
+            "SELECT compressed FROM blobs WHERE channel = 'notes'"
+        ).fetchone()
+    assert compressed == 1
+
+
+def test_unchanged_channels_are_read_from_earlier_blobs(tmp_path):
+    checkpointer = make_checkpointer(tmp_path / "checkpoints.sqlite3")
+
+    first, _ = put(checkpointer, None, {"a": 1, "b": "x" * 200}, changed=["a", "b"])
+    second, config = put(
+        checkpointer, first, {"a": 2, "b": "x" * 200}, changed=["a"], step=1
+    )
+
+    loaded = checkpointer.get_tuple({"configurable": {"thread_id": "thread"}})
+    assert loaded is not None
+    assert loaded.checkpoint["id"] == second["id"]
+    assert loaded.checkpoint["channel_values"] == {"a": 2, "b": "x" * 200}
+    assert loaded.parent_config["configurable"]["checkpoint_id"] == first["id"]
+    # "b" was written once and is shared by both checkpoints.
+    assert count_rows(tmp_path / "checkpoints.sqlite3", "blobs", channel="b") == 1
+    assert [item.checkpoint["id"] for item in checkpointer.list(config)] == [
+        second["id"]
+    ]
+    assert [
+        item.checkpoint["id"]
+        for item in checkpointer.list({"configurable": {"thread_id": "thread"}})
+    ] == [second["id"], first["id"]]
+
+
+def test_keeps_only_the_last_checkpoints(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    checkpointer = make_checkpointer(path, keep_last=2)
+
+    checkpoints = []
+    parent = None
+    for step in range(4):
+        parent, config = put(
+            checkpointer,
+            parent,
+            {"counter": step, "constant": "kept"},
+            changed=["counter", "constant"] if step == 0 else ["counter"],
+            step=step,
+        )
+        checkpointer.put_writes(config, [("counter", step + 1)], task_id="task")
+        checkpoints.append(parent)
+
+    listed = [
+        item.checkpoint["id"]
+        for item in checkpointer.list({"configurable": {"thread_id": "thread"}})
+    ]
+    assert listed == [checkpoints[3]["id"], checkpoints[2]["id"]]
+    assert count_rows(path, "writes") == 2
+    # Blobs of dropped counter versions are gone, the shared one stays.
+    assert count_rows(path, "blobs", channel="counter") == 2
+    assert count_rows(path, "blobs", channel="constant") == 1
+
+    loaded = checkpointer.get_tuple({"configurable": {"thread_id": "thread"}})
+    assert loaded.checkpoint["channel_values"] == {"counter": 3, "constant": "kept"}
+
+
+def test_drops_subgraphs_of_finished_steps(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    checkpointer = make_checkpointer(path)
+
+    root, _ = put(checkpointer, None, {"notes": []}, changed=["notes"])
+    put(
+        checkpointer,
+        None,
+        {"topic": "solar"},
+        changed=["topic"],
+        checkpoint_ns="researcher:1",
+        root_checkpoint_id=root["id"],
+    )
+    put(checkpointer, None, {"x": 1}, changed=["x"], thread_id="other")
+    assert count_rows(path, "checkpoints", checkpoint_ns="researcher:1") == 1
+
+    put(checkpointer, root, {"notes": ["done"]}, changed=["notes"], step=1)
+
+    for table in ("checkpoints", "blobs"):
+        assert count_rows(path, table, checkpoint_ns="researcher:1") == 0
+    assert count_rows(path, "checkpoints", thread_id="other") == 1
+
+
+def test_delete_thread(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    checkpointer = make_checkpointer(path)
+    _, config = put(checkpointer, None, {"a": 1}, changed=["a"])
+    checkpointer.put_writes(config, [("a", 2)], task_id="task")
+
+    checkpointer.delete_thread("thread")
+
+    for table in ("checkpoints", "blobs", "writes"):
+        assert count_rows(path, table) == 0
+
+
+class CounterState(typing.TypedDict):
+    steps: typing.Annotated[list[str], operator.add]
+
+
+def build_graph(checkpointer: SqliteCheckpointer, failures: list[str]):
+    def first(state: CounterState) -> dict:
+        return {"steps": ["first"]}
+
+    def second(state: CounterState) -> dict:
+        if failures:
+            raise RuntimeError(failures.pop())
+        return {"steps": ["second"]}
+
+    graph = StateGraph(CounterState)
+    graph.add_node(first)
+    graph.add_node(second)
+    graph.add_edge("__start__", "first")
+    graph.add_edge("first", "second")
+
+    return graph.compile(checkpointer=checkpointer)
+
+
+def test_resumes_in_a_new_process(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    config = {"configurable": {"thread_id": "run"}}
+
+    graph = build_graph(make_checkpointer(path), failures=["crash"])
+    with pytest.raises(RuntimeError, match="crash"):
+        graph.invoke({"steps": []}, config)
+
+    # A fresh checkpointer on the same file, as after a restart.
+    graph = build_graph(make_checkpointer(path), failures=[])
+    assert graph.get_state(config).next == ("second",)
+    assert graph.invoke(None, config) == {"steps": ["first", "second"]}
+    assert graph.get_state(config).next == ()
+
+
+def test_async_api(tmp_path):
+    checkpointer = make_checkpointer(tmp_path / "checkpoints.sqlite3")
+    graph = build_graph(checkpointer, failures=[])
+    config = {"configurable": {"thread_id": "run"}}
+
+    async def run() -> tuple[dict, list]:
+        result = await graph.ainvoke({"steps": []}, config)
+        history = [item async for item in checkpointer.alist(config)]
+        return result, history
+
+    result, history = asyncio.run(run())
+
+    assert result == {"steps": ["first", "second"]}
+    assert 0 < len(history) <= 3
+    assert history[0].checkpoint["channel_values"]["steps"] == ["first", "second"]
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from concurrency import AdaptiveLimiter, is_overload
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def make_limiter(initial_limit: int, min_limit: int = 1) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        "test",
+        initial_limit=initial_limit,
+        min_limit=min_limit,
+        max_limit=8,
+        backoff_factor=0.5,
+        latency_tolerance=2.0,
+        priority_aging_sec=5,
+    )
+
+
+async def call(limiter: AdaptiveLimiter, error: Exception | None = None) -> None:
+    async with limiter.slot("endpoint"):
+        await asyncio.sleep(0.001)
+        if error is not None:
+            raise error
+
+
+def test_backs_off_once_per_burst_of_overloads():
+    limiter = make_limiter(initial_limit=8)
+
+    async def run() -> None:
+        await asyncio.gather(
+            *(call(limiter, RateLimitError("slow down")) for _ in range(4)),
+            return_exceptions=True,
+        )
+
+    asyncio.run(run())
+    assert limiter.limit == 4
+
+    asyncio.run(run())
+    assert limiter.limit == 2
+
+
+def test_ignores_other_errors():
+    limiter = make_limiter(initial_limit=8)
+
+    async def run() -> None:
+        await call(limiter, ValueError("bad input"))
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert limiter.limit == 8
+
+
+def test_never_drops_below_the_minimum():
+    limiter = make_limiter(initial_limit=4, min_limit=3)
+
+    async def run() -> None:
+        await call(limiter, RateLimitError("slow down"))
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(run())
+    assert limiter.limit == 3
+
+
+def test_grows_back_while_saturated():
+    limiter = make_limiter(initial_limit=8)
+
+    async def run() -> None:
+        with pytest.raises(RateLimitError):
+            await call(limiter, RateLimitError("slow down"))
+        await asyncio.gather(*(call(limiter) for _ in range(40)))
+
+    asyncio.run(run())
+    assert limiter.limit > 4
+    assert limiter.stats().in_flight == 0
+
+
+def test_is_overload():
+    assert is_overload(RateLimitError())
+    assert is_overload(TimeoutError())
+    assert not is_overload(ValueError())
@@ -0,0 +1,15 @@
+from content_reduction import is_boilerplate, reduce_content
+
+
+def test_keeps_numeric_lines_and_table_rows():
+    assert not is_boilerplate("| 2021 | 5.3 | 12% |")
+    assert not is_boilerplate("1,204 / 3,880 (31%)")
+    assert is_boilerplate("* * * --- * * *")
+
+
+def test_truncates_when_nothing_is_left():
+    content = "\n".join(
+        ["Accept all cookies", "Subscribe to our newsletter", "-- * --"] * 50
+    )
+
+    assert reduce_content(content, query="solar", token_budget=10) == content[:40]
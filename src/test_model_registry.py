@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from config import ModelSettings
+import metrics
+from model_registry import ModelRegistry
+
+
+def test_counts_retries(monkeypatch):
+    registry = metrics.MetricsRegistry(enabled=True)
+    monkeypatch.setattr(metrics, "registry", registry)
+
+    failures = [ConnectionError("reset")]
+
+    def flaky(input: str) -> str:
+        if failures:
+            raise failures.pop()
+        return f"answer to {input}"
+
+    models = ModelRegistry(
+        api_key="test",
+        max_connections=4,
+        max_keepalive_connections=4,
+        keepalive_expiry_sec=5,
+        chat_model_factory=lambda **kwargs: RunnableLambda(flaky),
+    )
+    llm = models.get(ModelSettings(model="flaky", max_retries=3))
+
+    assert asyncio.run(llm.ainvoke("question")) == "answer to question"
+    assert registry.run_summary("default")["operations"]["unknown"]["retries"] == 1
+    assert (
+        'silly_search_llm_retries_total{endpoint="llm:flaky:chat",operation="unknown"} 1'
+        in registry.render_prometheus()
+    )
+
+
+def test_rejects_tools_with_a_schema():
+    models = ModelRegistry(
+        api_key="test",
+        max_connections=4,
+        max_keepalive_connections=4,
+        keepalive_expiry_sec=5,
+    )
+
+    with pytest.raises(ValueError):
+        models.get(
+            ModelSettings(model="model", max_retries=1),
+            tools=[ModelSettings],
+            schema=ModelSettings,
+        )
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from scheduling import FairQueue
+
+
+def drain[T](queue: FairQueue[T]) -> list[T]:
+    return [queue.pop() for _ in range(len(queue))]
+
+
+def test_serves_higher_priorities_first():
+    queue = FairQueue[str](aging_sec=60)
+    queue.push("bulk", priority="bulk", session="a")
+    queue.push("research", priority="research", session="a")
+    queue.push("critical", priority="critical", session="a")
+
+    assert drain(queue) == ["critical", "research", "bulk"]
+
+
+def test_takes_turns_between_sessions():
+    queue = FairQueue[str](aging_sec=60)
+    for item in ("a1", "a2", "a3"):
+        queue.push(item, priority="research", session="a")
+    for item in ("b1", "b2"):
+        queue.push(item, priority="research", session="b")
+
+    assert drain(queue) == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_waiting_promotes_items(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "perf_counter", lambda: now[0])
+    queue = FairQueue[str](aging_sec=5)
+
+    queue.push("bulk", priority="bulk", session="a")
+    now[0] += 11
+    queue.push("critical", priority="critical", session="b")
+
+    # Two classes down, but waiting 11 seconds is worth more than two classes.
+    assert drain(queue) == ["bulk", "critical"]
+
+
+def test_remove():
+    queue = FairQueue[str](aging_sec=60)
+    queue.push("a", priority="research", session="a")
+    queue.push("b", priority="research", session="a")
+
+    queue.remove("a")
+
+    assert len(queue) == 1
+    assert drain(queue) == ["b"]
+    with pytest.raises(ValueError):
+        queue.remove("a")
+    with pytest.raises(IndexError):
+        queue.pop()
@@ -0,0 +1,39 @@
+from urls import canonicalize_url
+
+
+def test_strips_tracking_parameters():
+    assert (
+        canonicalize_url(
+            "https://example.com/a?utm_source=x&id=3&fbclid=y&UTM_Medium=z"
+        )
+        == "https://example.com/a?id=3"
+    )
+
+
+def test_drops_the_fragment():
+    assert (
+        canonicalize_url("https://example.com/a#section-2") == "https://example.com/a"
+    )
+
+
+def test_lowercases_the_host():
+    assert canonicalize_url("https://Example.COM/Path") == "https://example.com/Path"
+
+
+def test_merges_page_variants():
+    variants = [
+        "http://www.example.com/news/story/",
+        "https://m.example.com:443/news/story?utm_campaign=feed",
+        "https://example.com/news/story/amp",
+    ]
+
+    assert {canonicalize_url(url) for url in variants} == {
+        "https://example.com/news/story"
+    }
+
+
+def test_keeps_what_tells_pages_apart():
+    assert canonicalize_url("https://example.com:8080/a?b=2&a=1") == (
+        "https://example.com:8080/a?a=1&b=2"
+    )
+    assert canonicalize_url("not a url") == "not a url"
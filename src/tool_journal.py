@@ -0,0 +1,52 @@
+import functools
+from collections.abc import Awaitable, Callable
+
+from cache import TieredCache
+from config import cfg
+
+
+class ToolJournal:
+    """
+    Durable record of finished tool calls, keyed by run and tool_call_id.
+
+    Checkpoints are only taken between nodes, so a run resumed after a crash replays
+    every tool call of the node that was interrupted. Calls that finished before the
+    crash are served from the journal, only the missing ones execute again. Failed
+    calls raise through and are not recorded.
+    """
+
+    def __init__(self, cache: TieredCache, ttl_sec: int) -> None:
+        self.replayed = 0
+        self.__cache = cache
+        self.__ttl_sec = ttl_sec
+
+    async def run(self, key: str, cb: Callable[[], Awaitable[str]]) -> str:
+        recorded = await self.__cache.get(key)
+        if recorded is not None:
+            self.replayed += 1
+            return recorded
+
+        result = await cb()
+        await self.__cache.set(key, result, ttl_sec=self.__ttl_sec)
+
+        return result
+
+
+@functools.cache
+def default_journal() -> ToolJournal | None:
+    if not cfg.tool_journal_enabled:
+        return None
+
+    return ToolJournal(
+        cache=TieredCache(
+            name="tool_journal",
+            max_memory_entries=cfg.tool_journal_max_memory_entries,
+            path=cfg.cache_path(cfg.tool_journal_path),
+            max_disk_bytes=cfg.tool_journal_max_disk_bytes,
+        ),
+        ttl_sec=cfg.tool_journal_ttl_sec,
+    )
+
+
+def journal_key(run_id: str, tool_call_id: str, *parts: str) -> str:
+    return ":".join((run_id, tool_call_id, *parts))
@@ -0,0 +1,62 @@
+import urllib.parse
+
+TRACKING_PARAMS = frozenset(
+    {
+        "fbclid",
+        "gclid",
+        "dclid",
+        "msclkid",
+        "yclid",
+        "igshid",
+        "mc_cid",
+        "mc_eid",
+        "_hsenc",
+        "_hsmi",
+        "ref",
+        "ref_src",
+        "amp",
+        "outputtype",
+    }
+)
+TRACKING_PARAM_PREFIXES = ("utm_",)
+HOST_PREFIXES = ("www.", "m.", "amp.")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Maps the variants of a page onto one key: http and https, www/m/amp hosts,
+    default ports, tracking parameters, parameter order, fragments, `/amp` suffixes
+    and trailing slashes don't tell pages apart.
+
+    Meant for deduplication only, the result is not guaranteed to resolve.
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    if not parts.netloc:
+        return url
+
+    host = (parts.hostname or "").rstrip(".")
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix) :]
+    if parts.port and parts.port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or "/"
+    if path.endswith("/amp") or path.endswith("/amp/"):
+        path = path[: path.rindex("/amp")] or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = urllib.parse.urlencode(
+        sorted(
+            (key, value)
+            for key, value in urllib.parse.parse_qsl(
+                parts.query, keep_blank_values=True
+            )
+            if key.lower() not in TRACKING_PARAMS
+            and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+        )
+    )
+
+    return urllib.parse.urlunsplit(("https", host, path, query, ""))
@@ -9,6 +9,17 @@ def get_readable_date() -> str:
     return datetime.now().strftime("%a %b %d, %Y")
 
 
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token), good enough for budgeting.
+    """
+    return (len(text) + 3) // 4
+
+
+def get_run_id(config: RunnableConfig) -> str:
+    return str(config.get("configurable", {}).get("thread_id", "default"))
+
+
 async def async_noop() -> None:
     pass
 
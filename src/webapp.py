@@ -0,0 +1,29 @@
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+import metrics
+
+
+async def prometheus_metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics.registry.render_prometheus(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+async def run_summary(request: Request) -> JSONResponse:
+    summary = metrics.registry.run_summary(request.path_params["thread_id"])
+    if summary is None:
+        return JSONResponse({"detail": "Unknown run"}, status_code=404)
+
+    return JSONResponse(summary)
+
+
+app = Starlette(
+    routes=[
+        Route("/metrics", prometheus_metrics),
+        Route("/metrics/runs/{thread_id}", run_summary),
+    ]
+)